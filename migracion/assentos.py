@@ -0,0 +1,89 @@
+"""
+MAPA DE ASSENTOS EM BITMAP
+==========================
+Funções para o layout de assentos 'bitmap' (MIGRAR_LAYOUT_ASSENTOS=bitmap).
+
+Nesse layout cada horário guarda um campo `disponiveis` em BinData em que
+o bit N indica se o N-ésimo assento do veículo (na ordem de
+`veiculos.assentos`) está livre, e um contador `assentos_disponiveis`.
+O bit N fica no byte N // 8, na posição N % 8 a partir do bit menos
+significativo, a mesma numeração usada por $bitsAllSet / $bitsAllClear.
+"""
+
+from bson import Binary
+
+
+def codificar_mapa(posicoes, tamanho=0):
+    """Bitmap com os bits de `posicoes` ligados (pelo menos `tamanho` bits)"""
+    posicoes = list(posicoes)
+    mapa = bytearray((max(posicoes + [tamanho - 1]) + 8) // 8)
+    for posicao in posicoes:
+        mapa[posicao // 8] |= 1 << (posicao % 8)
+    return Binary(bytes(mapa))
+
+
+def assento_disponivel(mapa, posicao):
+    """Diz se o assento da posição está livre"""
+    return posicao // 8 < len(mapa) and bool(mapa[posicao // 8] >> (posicao % 8) & 1)
+
+
+def assentos_disponiveis(mapa):
+    """Posições de todos os assentos livres"""
+    return [
+        indice * 8 + bit
+        for indice, byte in enumerate(mapa) if byte
+        for bit in range(8) if byte >> bit & 1
+    ]
+
+
+def contar_disponiveis(mapa):
+    """Quantos assentos estão livres"""
+    return sum(bin(byte).count('1') for byte in mapa)
+
+
+def filtro_assento_disponivel(posicao):
+    """Filtro do MongoDB para horários com o assento da posição livre"""
+    return {"disponiveis": {"$bitsAllSet": [posicao]}}
+
+
+def marcar_assento(horarios, id_horario, posicao, disponivel, tentativas=5):
+    """
+    Marca um assento de um horário como livre ou ocupado.
+
+    Como o MongoDB não altera bits de BinData, a troca é feita com
+    compare-and-swap: o update só vale se o bitmap ainda for o que foi
+    lido, e é repetido se outro processo mudou o horário no meio.
+    Devolve False se o assento já estava no estado pedido.
+    """
+    for _ in range(tentativas):
+        horario = horarios.find_one({"_id": id_horario}, {"disponiveis": 1})
+        if horario is None:
+            raise KeyError(f"Horário {id_horario} não encontrado")
+
+        atual = horario["disponiveis"]
+        if assento_disponivel(atual, posicao) == disponivel:
+            return False
+
+        mapa = bytearray(atual)
+        if posicao // 8 >= len(mapa):
+            mapa.extend(bytes(posicao // 8 + 1 - len(mapa)))
+        mapa[posicao // 8] ^= 1 << (posicao % 8)
+
+        resultado = horarios.update_one(
+            {"_id": id_horario, "disponiveis": atual},
+            {"$set": {"disponiveis": Binary(bytes(mapa))},
+             "$inc": {"assentos_disponiveis": 1 if disponivel else -1}}
+        )
+        if resultado.modified_count:
+            return True
+    raise RuntimeError(f"Horário {id_horario} alterado por outro processo {tentativas} vezes seguidas")
+
+
+def reservar_assento(horarios, id_horario, posicao):
+    """Ocupa um assento; devolve False se ele já estava ocupado"""
+    return marcar_assento(horarios, id_horario, posicao, False)
+
+
+def liberar_assento(horarios, id_horario, posicao):
+    """Libera um assento; devolve False se ele já estava livre"""
+    return marcar_assento(horarios, id_horario, posicao, True)
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+BENCHMARK DA MIGRAÇÃO
+=====================
+Mede o desempenho do migrar.py com volumes de dados controlados.
+
+O que faz?
+- Cria um banco PostgreSQL separado com o esquema do db.sql
+- Gera dados sintéticos (direto no PostgreSQL, com generate_series)
+  para cada escala, medida em número de tickets
+- Roda o Migrador de ponta a ponta contra um MongoDB separado, em um
+  processo novo por escala
+- Registra vazão e pico de memória (RSS) de cada passo em um JSON e,
+  se houver um resultado anterior, aponta os passos que ficaram mais lentos
+
+Uso:
+    BENCH_ESCALAS=10000,100000,1000000 python benchmark.py
+"""
+
+import json
+import math
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psycopg2
+
+import migrar
+from migrar import Migrador, POSTGRES
+
+# === CONFIGURAÇÃO DO BENCHMARK ===
+# Bancos usados só pelo benchmark (os dados são apagados e gerados de novo)
+BANCO_PG = os.getenv('BENCH_PG_DATABASE', 'rododados_bench')
+BANCO_MONGO = os.getenv('BENCH_MONGO_DATABASE', 'rododados_bench')
+# Escalas, em número de tickets
+ESCALAS = [int(escala) for escala in os.getenv('BENCH_ESCALAS', '10000,100000,1000000').split(',')]
+# Esquema das tabelas (o mesmo db.sql usado pelo docker-compose)
+ESQUEMA = os.getenv('BENCH_ESQUEMA', os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db.sql'))
+# Onde gravar os resultados e com qual resultado anterior comparar
+SAIDA = os.getenv('BENCH_SAIDA', 'benchmark.json')
+REFERENCIA = os.getenv('BENCH_REFERENCIA', '')
+# Queda de documentos/s (em fração) a partir da qual um passo conta como regressão
+TOLERANCIA = float(os.getenv('BENCH_TOLERANCIA', '0.10'))
+
+TABELAS = [
+    'company', 'busstop', 'route', 'companyroute', 'vehicle', 'seat', 'passenger',
+    'employee', 'schedule', 'scheduleemployee', 'seatonschedule', 'ticket',
+]
+# Cada veículo tem 40 assentos (10 fileiras x 4 colunas) e 70% dos
+# assentos de cada horário têm ticket
+VENDIDOS_POR_HORARIO = 28
+
+
+def tamanhos(tickets):
+    """Quantidade de linhas de cada tabela para uma escala"""
+    horarios = max(1, math.ceil(tickets / VENDIDOS_POR_HORARIO))
+    rotas = max(5, horarios // 50)
+    return {
+        'horarios': horarios,
+        'tickets': horarios * VENDIDOS_POR_HORARIO,
+        'rotas': rotas,
+        'paradas': math.isqrt(rotas) + 2,
+        'empresas': max(3, rotas // 10),
+        'veiculos': max(5, horarios // 20),
+        'passageiros': max(100, tickets // 5),
+        'funcionarios': max(10, horarios // 5),
+    }
+
+
+# Tudo é gerado no servidor, sem trafegar linhas pelo Python. As escolhas
+# usam aritmética sobre os ids em vez de random(), então cada escala gera
+# sempre os mesmos dados.
+SQL_GERAR = [
+    """INSERT INTO company (cnpj, name)
+       SELECT lpad(i::text, 14, '0'), 'Empresa ' || i FROM generate_series(1, %(empresas)s) i""",
+    """INSERT INTO busstop (name, location)
+       SELECT 'Parada ' || i, 'Endereço ' || i FROM generate_series(1, %(paradas)s) i""",
+    """INSERT INTO route (origin_id, destination_id, distance)
+       SELECT o, d, 50 + (o * 31 + d * 17) %% 900
+       FROM generate_series(1, %(paradas)s) o, generate_series(1, %(paradas)s) d
+       WHERE o <> d ORDER BY o, d LIMIT %(rotas)s""",
+    """INSERT INTO companyroute (cnpj, route_id)
+       SELECT lpad((1 + r %% %(empresas)s)::text, 14, '0'), r FROM generate_series(1, %(rotas)s) r
+       UNION ALL
+       SELECT lpad((1 + (r + 1) %% %(empresas)s)::text, 14, '0'), r
+       FROM generate_series(1, %(rotas)s) r WHERE r %% 3 = 0""",
+    """INSERT INTO vehicle (license_plate, brand, model)
+       SELECT 'B' || lpad(i::text, 6, '0'), 'Marca ' || i %% 7, 'Modelo ' || i %% 13
+       FROM generate_series(1, %(veiculos)s) i""",
+    """INSERT INTO seat (seat_row, seat_column, license_plate)
+       SELECT lpad(f::text, 2, '0'), c, 'B' || lpad(v::text, 6, '0')
+       FROM generate_series(1, %(veiculos)s) v, generate_series(1, 10) f,
+            unnest(ARRAY['A', 'B', 'C', 'D']) c
+       ORDER BY v, f, c""",
+    """INSERT INTO passenger (cpf, first_name, last_name, birthday, email, phone, type_passenger)
+       SELECT lpad(i::text, 11, '0'), 'Nome' || i, 'Sobrenome' || i, date '1950-01-01' + i %% 20000,
+              'p' || i || '@bench.test', '119' || lpad((i %% 100000000)::text, 8, '0'),
+              (ARRAY['normal', 'estudante', 'idoso'])[1 + i %% 3]
+       FROM generate_series(1, %(passageiros)s) i""",
+    """INSERT INTO employee (cpf, first_name, last_name, birthday, email, phone, role, n_license)
+       SELECT lpad(i::text, 11, '0'), 'Func' || i, 'Sobrenome' || i, date '1960-01-01' + i %% 15000,
+              'f' || i || '@bench.test', '119' || lpad((i %% 100000000)::text, 8, '0'),
+              (ARRAY['motorista', 'cobrador'])[1 + i %% 2], 'CNH' || i
+       FROM generate_series(1, %(funcionarios)s) i""",
+    """INSERT INTO schedule (departure_time, arrival_time, travel_time, route_id)
+       SELECT timestamp '2025-01-01' + h * interval '30 minutes',
+              timestamp '2025-01-01' + h * interval '30 minutes' + interval '3 hours',
+              interval '3 hours', 1 + h %% %(rotas)s
+       FROM generate_series(1, %(horarios)s) h""",
+    """INSERT INTO scheduleemployee (schedule_id, employee_cpf)
+       SELECT h, lpad((1 + h %% %(funcionarios)s)::text, 11, '0') FROM generate_series(1, %(horarios)s) h
+       UNION ALL
+       SELECT h, lpad((1 + (h + 1) %% %(funcionarios)s)::text, 11, '0') FROM generate_series(1, %(horarios)s) h""",
+    """INSERT INTO seatonschedule (seat_id, schedule_id, is_available)
+       SELECT (h %% %(veiculos)s) * 40 + k, h, (h * 40 + k) %% 10 >= 7
+       FROM generate_series(1, %(horarios)s) h, generate_series(1, 40) k
+       ORDER BY h, k""",
+    """INSERT INTO ticket (price, seat_on_schedule_id, passenger_cpf)
+       SELECT 20.50 + id %% 200, id, lpad((1 + id::bigint * 7919 %% %(passageiros)s)::text, 11, '0')
+       FROM seatonschedule WHERE NOT is_available ORDER BY id""",
+]
+
+
+def conectar(banco):
+    return psycopg2.connect(**{**POSTGRES, 'database': banco})
+
+
+def preparar_banco():
+    """Cria o banco do benchmark (se não existir) e as tabelas do db.sql"""
+    conexao = conectar('postgres')
+    conexao.autocommit = True
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_database WHERE datname = %s", (BANCO_PG,))
+        if cursor.fetchone() is None:
+            cursor.execute(f'CREATE DATABASE "{BANCO_PG}"')
+    conexao.close()
+
+    conexao = conectar(BANCO_PG)
+    with conexao, conexao.cursor() as cursor, open(ESQUEMA, encoding='utf-8') as arquivo:
+        cursor.execute(arquivo.read())
+    conexao.close()
+
+
+def gerar_dados(tickets):
+    """
+    Gera os dados de uma escala, reaproveitando os que já estiverem no
+    banco se tiverem o mesmo número de tickets.
+    """
+    quantidades = tamanhos(tickets)
+    conexao = conectar(BANCO_PG)
+    with conexao.cursor() as cursor:
+        cursor.execute("SELECT count(*) FROM ticket")
+        existentes = cursor.fetchone()[0]
+    if existentes == quantidades['tickets']:
+        print(f"   Reaproveitando os dados de {quantidades['tickets']} tickets")
+        conexao.close()
+        return quantidades
+
+    with conexao, conexao.cursor() as cursor:
+        print(f"   Gerando {quantidades['tickets']} tickets em {quantidades['horarios']} horários...")
+        inicio = time.perf_counter()
+        cursor.execute(f"TRUNCATE {', '.join(TABELAS)} RESTART IDENTITY CASCADE")
+        for sql in SQL_GERAR:
+            cursor.execute(sql, quantidades)
+    conexao.autocommit = True
+    with conexao.cursor() as cursor:
+        cursor.execute("ANALYZE")
+    conexao.close()
+    print(f"   Dados gerados em {time.perf_counter() - inicio:.1f} s")
+    return quantidades
+
+
+def rss_atual():
+    """Memória residente do processo em bytes (Linux)"""
+    with open('/proc/self/statm') as arquivo:
+        return int(arquivo.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class MonitorMemoria:
+    """Amostra o RSS em uma thread e guarda o maior valor visto"""
+
+    def __init__(self, intervalo=0.02):
+        self.intervalo = intervalo
+        self.pico = rss_atual()
+        self.parar = threading.Event()
+        self.thread = threading.Thread(target=self.amostrar, daemon=True)
+
+    def amostrar(self):
+        while not self.parar.wait(self.intervalo):
+            self.pico = max(self.pico, rss_atual())
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *erro):
+        self.parar.set()
+        self.thread.join()
+        self.pico = max(self.pico, rss_atual())
+
+
+# Pico de RSS de cada passo (um processo por escala, então um dicionário basta)
+picos_memoria = {}
+
+
+class MigradorMedido(Migrador):
+    """
+    Migrador que registra o pico de RSS durante cada passo.
+
+    O RSS é do processo inteiro: com MIGRAR_PARALELISMO > 1 o pico de um
+    passo inclui os passos que rodaram ao mesmo tempo que ele.
+    """
+
+    def migrar_passo(self, passo):
+        with MonitorMemoria() as monitor:
+            resultado = super().migrar_passo(passo)
+        picos_memoria[passo] = monitor.pico
+        return resultado
+
+
+def medir_escala(tickets):
+    """Roda a migração completa de uma escala (em um processo novo)"""
+    POSTGRES['database'] = BANCO_PG
+    migrar.MONGODB_NOME = BANCO_MONGO
+
+    with MonitorMemoria() as monitor:
+        inicio = time.perf_counter()
+        migrador = MigradorMedido()
+        migrador.executar()
+        tempo = time.perf_counter() - inicio
+
+    passos = {}
+    for nome, medidas in migrador.metricas.passos.items():
+        resumo = medidas.resumo()
+        passos[nome] = {
+            "segundos": resumo["segundos"],
+            "linhas": resumo["linhas"],
+            "documentos": resumo["documentos"],
+            "linhas_por_segundo": resumo["linhas_por_segundo"],
+            "documentos_por_segundo": resumo["documentos_por_segundo"],
+            "mb_gravados": resumo["bytes"] / 1e6,
+            "pico_rss_mb": picos_memoria.get(nome, 0) / 1e6,
+        }
+    return {
+        "segundos": tempo,
+        "fases": migrador.metricas.fases,
+        "configuracao": migrador.metricas.como_dict()["configuracao"],
+        "pico_rss_mb": monitor.pico / 1e6,
+        "passos": passos,
+    }
+
+
+def versao_codigo():
+    """Commit atual, para saber de qual versão é cada resultado"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(resultados, caminho):
+    """Mostra os passos que ficaram mais lentos que no resultado de referência"""
+    with open(caminho, encoding='utf-8') as arquivo:
+        anteriores = {str(escala["tickets"]): escala for escala in json.load(arquivo)["escalas"]}
+
+    regressoes = 0
+    print(f"\n📉 Comparação com {caminho} (tolerância {TOLERANCIA:.0%})")
+    for escala in resultados:
+        anterior = anteriores.get(str(escala["tickets"]))
+        if anterior is None:
+            continue
+        for nome, passo in escala["passos"].items():
+            antes = anterior["passos"].get(nome, {}).get("documentos_por_segundo")
+            if not antes:
+                continue
+            variacao = passo["documentos_por_segundo"] / antes - 1
+            marca = "REGRESSÃO" if variacao < -TOLERANCIA else ""
+            regressoes += bool(marca)
+            print(f"   {escala['tickets']:>9d} {nome:13s} {variacao:+7.1%} {marca}")
+    return regressoes
+
+
+def main():
+    print("\n" + "="*60)
+    print("⏱️  BENCHMARK: PostgreSQL → MongoDB")
+    print("="*60)
+    preparar_banco()
+
+    resultados = []
+    for tickets in ESCALAS:
+        print(f"\n▶ Escala: {tickets} tickets")
+        quantidades = gerar_dados(tickets)
+        # Processo novo por escala: o pico de memória não herda o da escala anterior
+        contexto = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=contexto) as executor:
+            resultado = executor.submit(medir_escala, tickets).result()
+        resultados.append({"tickets": quantidades["tickets"], "linhas": quantidades, **resultado})
+
+    print("\n" + "="*60)
+    print("📊 RESULTADOS")
+    print("="*60)
+    print(f"   {'tickets':>9s} {'passo':13s} {'segundos':>9s} {'docs/s':>9s} {'linhas/s':>9s} {'pico RSS':>9s}")
+    for escala in resultados:
+        for nome, passo in escala["passos"].items():
+            print(
+                f"   {escala['tickets']:>9d} {nome:13s} {passo['segundos']['total']:9.2f} "
+                f"{passo['documentos_por_segundo']:9.0f} {passo['linhas_por_segundo']:9.0f} "
+                f"{passo['pico_rss_mb']:7.0f}MB"
+            )
+        print(f"   {escala['tickets']:>9d} {'(total)':13s} {escala['segundos']:9.2f} "
+              f"{'':9s} {'':9s} {escala['pico_rss_mb']:7.0f}MB")
+
+    with open(SAIDA, 'w', encoding='utf-8') as arquivo:
+        json.dump({"versao": versao_codigo(), "escalas": resultados}, arquivo, indent=2, ensure_ascii=False)
+    print(f"\nResultados gravados em {SAIDA}")
+
+    if REFERENCIA:
+        return 1 if comparar(resultados, REFERENCIA) else 0
+    return 0
+
+
+# === PONTO DE INÍCIO ===
+if __name__ == "__main__":
+    sys.exit(main())
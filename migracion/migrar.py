@@ -12,11 +12,23 @@ O que faz?
 """
 
 import psycopg2
-from pymongo import MongoClient
+from pymongo import MongoClient, ReplaceOne, DeleteOne
+from pymongo.write_concern import WriteConcern
 from dotenv import load_dotenv
 import os
+import hashlib
+import json
+import queue
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ALL_COMPLETED, FIRST_COMPLETED, wait
 from datetime import datetime
-from bson import ObjectId
+from decimal import Decimal
+from bson import ObjectId, encode
+
+from assentos import codificar_mapa
 
 # Carregar configuração do arquivo .env
 load_dotenv()
@@ -33,6 +45,632 @@ POSTGRES = {
 MONGODB_URI = os.getenv('MONGO_URI', 'mongodb://mongodb:27017/')
 MONGODB_NOME = os.getenv('MONGO_DATABASE', 'rododados_mongo')
 
+# === CONFIGURAÇÃO DO STREAMING ===
+# Linhas trazidas do PostgreSQL por ida ao servidor (cursores do lado do servidor)
+PG_TAMANHO_FETCH = int(os.getenv('MIGRAR_PG_FETCH', '5000'))
+# Documentos enviados ao MongoDB por insert_many
+MONGO_TAMANHO_LOTE = int(os.getenv('MIGRAR_MONGO_LOTE', '1000'))
+# Threads que enviam lotes ao MongoDB ao mesmo tempo, por coleção
+MONGO_ESCRITORES = int(os.getenv('MIGRAR_MONGO_ESCRITORES', '1'))
+# Write concern usado só na carga dos dados ('1', '0', 'majority'...)
+_W_CARGA = os.getenv('MIGRAR_WRITE_CONCERN', '1')
+WRITE_CONCERN_CARGA = WriteConcern(w=int(_W_CARGA) if _W_CARGA.isdigit() else _W_CARGA)
+# Índices secundários criados 'antes' ou 'depois' da carga
+ORDEM_INDICES = os.getenv('MIGRAR_INDICES', 'depois')
+# Com MIGRAR_PIPELINE=1 cada passo roda em três estágios ao mesmo tempo,
+# ligados por filas limitadas (a fila cheia segura o estágio anterior):
+#   extração      - uma thread por consulta lê blocos do PostgreSQL (LeituraAntecipada)
+#   transformação - a thread do passo monta os documentos
+#   carga         - threads do GravadorEmLotes gravam os lotes no MongoDB
+# Desligado por padrão: com 1 CPU o ganho de sobrepor as esperas se perde
+# na disputa pelo GIL (ver "Pipeline" no README)
+PIPELINE = os.getenv('MIGRAR_PIPELINE', '0') == '1'
+# Blocos de PG_TAMANHO_FETCH linhas lidos à frente, por consulta
+PIPELINE_FILA = int(os.getenv('MIGRAR_PIPELINE_FILA', '4'))
+# Lotes montados esperando gravação, por escritor do MongoDB
+PIPELINE_LOTES = int(os.getenv('MIGRAR_PIPELINE_LOTES', '2'))
+# Como ler as tabelas grandes (seat, seatonschedule, ticket):
+# 'cursor' (DB-API) ou 'copy' (COPY ... TO STDOUT, convertido em streaming)
+EXTRACAO = os.getenv('MIGRAR_EXTRACAO', 'cursor')
+
+# === CONFIGURAÇÃO DO PARALELISMO ===
+# Quantos passos rodam ao mesmo tempo (1 = um depois do outro)
+PARALELISMO = int(os.getenv('MIGRAR_PARALELISMO', '4'))
+
+# Passos da migração -> passos dos quais dependem (documentos que eles referenciam)
+PASSOS = {
+    'empresas': [],
+    'paradas': [],
+    'rotas': ['empresas', 'paradas'],
+    'veiculos': [],
+    'passageiros': [],
+    'funcionarios': [],
+    'horarios': ['rotas', 'passageiros', 'funcionarios'],
+}
+
+# === CONFIGURAÇÃO DA MIGRAÇÃO INCREMENTAL ===
+# 'completo' apaga o MongoDB e copia tudo; 'incremental' só reescreve o que mudou
+MODO = os.getenv('MIGRAR_MODO', 'completo')
+# Em quantos blocos cada tabela é dividida para comparar hashes
+BLOCOS = int(os.getenv('MIGRAR_BLOCOS', '1024'))
+# Coleção com o hash e as chaves de cada bloco já migrado
+COLECAO_CONTROLE = '_controle_blocos'
+# Blocos cujas chaves são comparadas e gravadas no controle de cada vez
+BLOCOS_POR_LOTE = 64
+
+# === RETOMADA ===
+# A migração completa registra em COLECAO_EXECUCAO a última chave gravada
+# de cada passo a cada lote; com MIGRAR_RETOMAR=1 uma execução interrompida
+# continua de onde parou em vez de apagar tudo e começar de novo
+RETOMAR = os.getenv('MIGRAR_RETOMAR', '0') == '1'
+COLECAO_EXECUCAO = '_controle_execucao'
+
+# === CARGA SEM INDISPONIBILIDADE ===
+# Com MIGRAR_PREPARACAO=1 a migração completa grava em coleções com sufixo,
+# cria os índices e valida ali, e só então troca pelas coleções publicadas
+PREPARACAO = os.getenv('MIGRAR_PREPARACAO', '0') == '1'
+SUFIXO_PREPARACAO = '__preparacao'
+
+# === MÉTRICAS ===
+# Arquivos onde gravar as métricas da execução (vazio = não gravar)
+METRICAS_JSON = os.getenv('MIGRAR_METRICAS_JSON', '')
+# Arquivo .prom para o textfile collector do node_exporter
+METRICAS_PROMETHEUS = os.getenv('MIGRAR_METRICAS_PROM', '')
+# Documentos de cada lote codificados em BSON para estimar os bytes gravados
+METRICAS_AMOSTRA = int(os.getenv('MIGRAR_METRICAS_AMOSTRA', '16'))
+
+# === LAYOUT DOS TICKETS ===
+# 'embutido': tickets dentro de horarios.assentos[].tickets
+# 'baldes': tickets em documentos de tamanho fixo na coleção COLECAO_BALDES,
+#           e horarios guarda só contadores (bucket pattern)
+LAYOUT_TICKETS = os.getenv('MIGRAR_LAYOUT_TICKETS', 'embutido')
+TICKETS_POR_BALDE = int(os.getenv('MIGRAR_TICKETS_POR_BALDE', '100'))
+COLECAO_BALDES = 'horarios_tickets'
+
+# === LAYOUT DOS ASSENTOS ===
+# 'documentos': cada assento do horário é um subdocumento em horarios.assentos
+# 'bitmap': o horário referencia o veículo e guarda um bitmap (BinData) dos
+#           assentos livres, na ordem de veiculos.assentos (veja assentos.py)
+LAYOUT_ASSENTOS = os.getenv('MIGRAR_LAYOUT_ASSENTOS', 'documentos')
+
+# === RESUMOS PARA RELATÓRIOS ===
+# Com MIGRAR_RESUMOS=1 a migração também gera coleções pequenas, já agregadas:
+# ocupação por horário (montada junto com cada horário) e, a partir dela e
+# dos tickets, receita por rota por dia e gasto por passageiro (no servidor)
+RESUMOS = os.getenv('MIGRAR_RESUMOS', '0') == '1'
+COLECAO_RESUMO_HORARIOS = 'resumo_horarios'
+COLECAO_RESUMO_ROTAS = 'resumo_rotas_dia'
+COLECAO_RESUMO_PASSAGEIROS = 'resumo_passageiros'
+
+# === EVENTOS DE TICKETS ===
+# Com MIGRAR_EVENTOS_TICKETS=1 cada ticket também vira um evento numa coleção
+# time-series, com o horário da viagem como tempo e rota/empresas como metadados
+EVENTOS_TICKETS = os.getenv('MIGRAR_EVENTOS_TICKETS', '0') == '1'
+EVENTOS_GRANULARIDADE = os.getenv('MIGRAR_EVENTOS_GRANULARIDADE', 'hours')
+COLECAO_EVENTOS = 'eventos_tickets'
+OPCOES_EVENTOS = {"timeField": "momento", "metaField": "meta", "granularity": EVENTOS_GRANULARIDADE}
+
+# Tabelas lidas por cada passo: (FROM, chave do documento, texto da linha).
+# A primeira fonte é a tabela principal; as outras são as tabelas filhas,
+# cujas mudanças também obrigam a reescrever o documento do pai.
+FONTES = {
+    'empresas': [("company t", "t.cnpj", "t::text")],
+    'paradas': [("busstop t", "t.id", "t::text")],
+    'rotas': [
+        ("route t", "t.id", "t::text"),
+        ("companyroute t", "t.route_id", "t::text"),
+    ],
+    'veiculos': [
+        ("vehicle t", "t.license_plate", "t::text"),
+        ("seat t", "t.license_plate", "t::text"),
+    ],
+    'passageiros': [("passenger t", "t.cpf", "t::text")],
+    'funcionarios': [("employee t", "t.cpf", "t::text")],
+    'horarios': [
+        ("schedule t", "t.id", "t::text"),
+        ("scheduleemployee t", "t.schedule_id", "t::text"),
+        ("seatonschedule t JOIN seat s ON s.id = t.seat_id", "t.schedule_id", "t::text || s::text"),
+        ("ticket t JOIN seatonschedule sos ON sos.id = t.seat_on_schedule_id", "sos.schedule_id", "t::text"),
+    ],
+}
+if EVENTOS_TICKETS:
+    # Os eventos levam as empresas da rota: mudar CompanyRoute reescreve os horários da rota
+    FONTES['horarios'].append(
+        ("companyroute t JOIN schedule sch ON sch.route_id = t.route_id", "sch.id", "t::text")
+    )
+
+
+def id_deterministico(passo, chave):
+    """
+    ObjectId derivado da chave do PostgreSQL.
+
+    A mesma chave gera sempre o mesmo _id, em qualquer execução e em qualquer
+    thread, então não é preciso guardar dicionários chave -> ObjectId.
+    (Os 4 primeiros bytes não são mais um timestamp de criação.)
+    """
+    if chave is None:
+        return None
+    texto = f"{passo}:{str(chave).strip()}"
+    return ObjectId(hashlib.blake2b(texto.encode(), digest_size=12).digest())
+
+
+def colecoes_do_passo(passo):
+    """Coleções do MongoDB escritas por um passo"""
+    colecoes = [passo]
+    if passo == 'horarios' and LAYOUT_TICKETS == 'baldes':
+        colecoes.append(COLECAO_BALDES)
+    if passo == 'horarios' and RESUMOS:
+        colecoes.append(COLECAO_RESUMO_HORARIOS)
+    if passo == 'horarios' and EVENTOS_TICKETS:
+        colecoes.append(COLECAO_EVENTOS)
+    return colecoes
+
+
+def percentil(valores, p):
+    """Percentil `p` (0-100) pelo método do posto mais próximo"""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    posicao = max(0, min(len(ordenados) - 1, round(p / 100 * len(ordenados)) - 1))
+    return ordenados[posicao]
+
+
+def sql_bloco(chave):
+    """Expressão SQL que calcula o bloco (0..BLOCOS-1) de uma chave"""
+    return f"mod(hashtext(({chave})::text) & 2147483647, {BLOCOS})"
+
+
+class JuncaoOrdenada:
+    """
+    Junta linhas filhas a seus pais em memória (merge join).
+
+    As linhas filhas precisam vir ordenadas pela mesma chave que os pais,
+    assim cada tabela filha é lida uma única vez em vez de uma consulta por pai.
+    """
+
+    def __init__(self, linhas, chave=lambda linha: linha[0]):
+        self.linhas = iter(linhas)
+        self.chave = chave
+        self.atual = next(self.linhas, None)
+
+    def filhos_de(self, valor):
+        """Devolve as linhas filhas cuja chave é igual a `valor`"""
+        # Pular filhos sem pai (chave menor que a do pai atual)
+        while self.atual is not None and self.chave(self.atual) < valor:
+            self.atual = next(self.linhas, None)
+
+        filhos = []
+        while self.atual is not None and self.chave(self.atual) == valor:
+            filhos.append(self.atual)
+            self.atual = next(self.linhas, None)
+        return filhos
+
+
+class LeitorCopy:
+    """
+    Lê o resultado de um COPY (...) TO STDOUT em formato texto.
+
+    O COPY roda em uma thread própria (copy_expert só retorna no fim) e
+    entrega os blocos de bytes por uma fila limitada; a iteração separa as
+    linhas e converte cada coluna com `tipos`, devolvendo as mesmas tuplas
+    que um cursor devolveria.
+    """
+
+    FIM = object()
+    ESCAPES = {'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v'}
+    CONVERSORES = {
+        int: int,
+        Decimal: Decimal,
+        bool: lambda valor: valor == 't',
+        str: lambda valor: valor,
+    }
+
+    def __init__(self, conexao, sql, tipos):
+        self.conexao = conexao
+        self.sql = sql
+        self.conversores = [self.CONVERSORES[tipo] for tipo in tipos]
+        self.fila = queue.Queue(maxsize=64)
+        self.erro = None
+
+    def write(self, dados):
+        """Chamado pelo copy_expert a cada bloco recebido do servidor"""
+        self.fila.put(dados)
+
+    def copiar(self):
+        """Executa o COPY (roda na thread auxiliar)"""
+        try:
+            with self.conexao.cursor() as cursor:
+                cursor.copy_expert(f"COPY ({self.sql}) TO STDOUT", self, size=1 << 16)
+        except Exception as erro:
+            self.erro = erro
+        finally:
+            self.fila.put(self.FIM)
+
+    def desescapar(self, valor):
+        """Desfaz os escapes do formato texto do COPY (\\t, \\n, \\\\...)"""
+        if '\\' not in valor:
+            return valor
+        return re.sub(r'\\(.)', lambda m: self.ESCAPES.get(m.group(1), m.group(1)), valor)
+
+    def converter(self, linha):
+        """Converte uma linha do COPY na tupla com os tipos de cada coluna"""
+        campos = linha.decode().split('\t')
+        return tuple(
+            None if campo == '\\N' else conversor(self.desescapar(campo))
+            for campo, conversor in zip(campos, self.conversores)
+        )
+
+    def __iter__(self):
+        thread = threading.Thread(target=self.copiar, daemon=True)
+        thread.start()
+        resto = b''
+        dados = None
+        try:
+            while True:
+                dados = self.fila.get()
+                if dados is self.FIM:
+                    break
+                linhas = (resto + dados).split(b'\n')
+                resto = linhas.pop()
+                for linha in linhas:
+                    yield self.converter(linha)
+            if self.erro is not None:
+                raise self.erro
+        finally:
+            # Se o consumidor parar antes do fim, esvaziar a fila libera a thread
+            while dados is not self.FIM:
+                dados = self.fila.get()
+            thread.join()
+            self.conexao.close()
+
+
+class LeituraAntecipada:
+    """
+    Lê as linhas de uma consulta em uma thread própria, à frente do consumo.
+
+    Os blocos de linhas passam por uma fila limitada: enquanto o Python
+    monta documentos e o MongoDB grava, o PostgreSQL já entrega os próximos
+    blocos, e a fila cheia segura a leitura para a memória não crescer.
+    """
+
+    FIM = object()
+
+    def __init__(self, linhas, tamanho_bloco, blocos=PIPELINE_FILA):
+        self.linhas = linhas
+        self.tamanho_bloco = tamanho_bloco
+        self.fila = queue.Queue(maxsize=blocos)
+        self.parar = threading.Event()
+        self.erro = None
+
+    def colocar(self, item):
+        """Põe um item na fila; desiste se o consumidor já parou"""
+        while not self.parar.is_set():
+            try:
+                self.fila.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def blocos(self):
+        """Blocos de até tamanho_bloco linhas (um FETCH por bloco nos cursores)"""
+        if hasattr(self.linhas, 'fetchmany'):
+            while True:
+                bloco = self.linhas.fetchmany(self.tamanho_bloco)
+                if not bloco:
+                    return
+                yield bloco
+        
+        bloco = []
+        for linha in self.linhas:
+            bloco.append(linha)
+            if len(bloco) >= self.tamanho_bloco:
+                yield bloco
+                bloco = []
+        if bloco:
+            yield bloco
+
+    def ler(self):
+        """Lê a consulta em blocos (roda na thread auxiliar)"""
+        try:
+            for bloco in self.blocos():
+                if not self.colocar(bloco):
+                    return
+        except Exception as erro:
+            self.erro = erro
+        finally:
+            self.colocar(self.FIM)
+
+    def __iter__(self):
+        thread = threading.Thread(target=self.ler, daemon=True)
+        thread.start()
+        try:
+            while True:
+                bloco = self.fila.get()
+                if bloco is self.FIM:
+                    break
+                yield from bloco
+            if self.erro is not None:
+                raise self.erro
+        finally:
+            self.parar.set()
+            thread.join()
+
+
+def estimar_bytes(lote):
+    """
+    Estima o tamanho BSON de um lote pela média de até METRICAS_AMOSTRA
+    documentos espalhados por ele (codificar todos dobraria o custo de CPU
+    da carga, já que o driver também os codifica).
+    """
+    passo = -(-len(lote) // max(1, METRICAS_AMOSTRA))
+    amostra = lote[::passo]
+    return len(lote) * sum(len(encode(doc)) for doc in amostra) // len(amostra)
+
+
+class GravadorEmLotes:
+    """
+    Acumula documentos e envia ao MongoDB em lotes de tamanho fixo.
+
+    Assim a memória usada não cresce com o tamanho da tabela migrada.
+    Com mais de um escritor (ou com PIPELINE), os lotes são enviados por um
+    pool de threads (escritas não ordenadas), com no máximo `em_espera`
+    lotes por thread aguardando gravação.
+    """
+
+    def __init__(self, colecao, tamanho=MONGO_TAMANHO_LOTE, substituir=False,
+                 escritores=MONGO_ESCRITORES, medidas=None, ao_confirmar=None,
+                 em_espera=PIPELINE_LOTES):
+        self.colecao = colecao.with_options(write_concern=WRITE_CONCERN_CARGA)
+        self.tamanho = tamanho
+        self.substituir = substituir  # upsert por _id em vez de insert
+        self.lote = []
+        self.total = 0
+        self.medidas = medidas  # MedidasPasso que recebe latências e bytes
+        self.espera = 0.0  # tempo em que quem gera os documentos esperou o MongoDB
+        # Chamado com (última chave, total) quando um lote e todos os
+        # anteriores a ele já foram gravados
+        self.ao_confirmar = ao_confirmar
+        self.ultima_chave = None
+        self.escritores = escritores
+        self.em_espera = em_espera
+        self.executor = ThreadPoolExecutor(max_workers=escritores) if escritores > 1 or PIPELINE else None
+        self.pendentes = set()
+        self.enviados = deque()  # (futuro, última chave) na ordem de envio
+
+    def adicionar(self, documento, chave=None):
+        """Adiciona um documento e descarrega o lote quando estiver cheio"""
+        self.lote.append(documento)
+        self.ultima_chave = chave
+        if len(self.lote) >= self.tamanho:
+            self.descarregar()
+
+    def enviar(self, lote):
+        """Grava um lote no MongoDB (sem ordem, para o servidor paralelizar)"""
+        inicio = time.perf_counter()
+        if self.substituir:
+            self.colecao.bulk_write(
+                [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in lote],
+                ordered=False
+            )
+        else:
+            self.colecao.insert_many(lote, ordered=False)
+        if self.medidas is not None:
+            segundos = time.perf_counter() - inicio
+            self.medidas.registrar_lote(len(lote), estimar_bytes(lote), segundos)
+        return len(lote)
+
+    def descarregar(self):
+        """Envia o lote atual ao MongoDB"""
+        if not self.lote:
+            return
+        lote, self.lote = self.lote, []
+        inicio = time.perf_counter()
+        if self.executor is None:
+            self.total += self.enviar(lote)
+            self.confirmar(self.ultima_chave)
+        else:
+            # Limitar os lotes em espera para a memória continuar constante
+            while len(self.pendentes) >= self.em_espera * self.escritores:
+                self.aguardar(FIRST_COMPLETED)
+            futuro = self.executor.submit(self.enviar, lote)
+            self.pendentes.add(futuro)
+            self.enviados.append((futuro, self.ultima_chave))
+        self.espera += time.perf_counter() - inicio
+
+    def aguardar(self, condicao):
+        """Espera lotes em envio terminarem (propaga erros de escrita)"""
+        concluidos, self.pendentes = wait(self.pendentes, return_when=condicao)
+        
+        # Os lotes terminam fora de ordem; só o prefixo já gravado é
+        # confirmado, antes de propagar o erro de um lote posterior
+        while self.enviados and self.enviados[0][0] not in self.pendentes:
+            futuro, chave = self.enviados[0]
+            if futuro.exception() is not None:
+                break
+            self.enviados.popleft()
+            self.total += futuro.result()
+            self.confirmar(chave)
+        
+        for futuro in concluidos:
+            futuro.result()
+
+    def confirmar(self, chave):
+        """Avisa que tudo até `chave` (inclusive) já está no MongoDB"""
+        if self.ao_confirmar is not None and chave is not None:
+            self.ao_confirmar(chave, self.total)
+
+    def sincronizar(self):
+        """Envia o lote atual e espera todos os lotes em envio"""
+        self.descarregar()
+        if self.executor is not None:
+            self.aguardar(ALL_COMPLETED)
+
+    def finalizar(self):
+        """Envia os documentos que restaram no último lote"""
+        self.descarregar()
+        if self.executor is not None:
+            inicio = time.perf_counter()
+            self.aguardar(ALL_COMPLETED)
+            self.executor.shutdown()
+            self.espera += time.perf_counter() - inicio
+        if self.medidas is not None:
+            self.medidas.registrar_espera(self.espera)
+
+
+class MedidasPasso:
+    """
+    Contadores de um passo: linhas lidas, idas ao PostgreSQL, documentos,
+    bytes e latência de cada lote gravado.
+
+    O tempo do passo é dividido em extração (esperando linhas do
+    PostgreSQL), carga (esperando o MongoDB) e transformação (o resto,
+    montagem dos documentos em Python).
+    """
+
+    def __init__(self):
+        self.trava = threading.Lock()  # os lotes podem vir das threads de escrita
+        self.linhas = 0
+        self.idas_pg = 0
+        self.documentos = 0
+        self.bytes = 0
+        self.latencias = []
+        self.segundos_extracao = 0.0
+        self.segundos_carga = 0.0
+        self.segundos_total = 0.0
+
+    def registrar_leitura(self, linhas, idas, segundos):
+        with self.trava:
+            self.linhas += linhas
+            self.idas_pg += idas
+            self.segundos_extracao += segundos
+
+    def registrar_lote(self, documentos, tamanho, segundos):
+        with self.trava:
+            self.documentos += documentos
+            self.bytes += tamanho
+            self.latencias.append(segundos)
+
+    def registrar_espera(self, segundos):
+        with self.trava:
+            self.segundos_carga += segundos
+
+    def resumo(self):
+        """Dicionário com os contadores e as taxas derivadas deles"""
+        total = self.segundos_total
+        return {
+            "linhas": self.linhas,
+            "documentos": self.documentos,
+            "bytes": self.bytes,
+            "idas_pg": self.idas_pg,
+            "lotes": len(self.latencias),
+            "segundos": {
+                "total": total,
+                "extracao": self.segundos_extracao,
+                "transformacao": max(0.0, total - self.segundos_extracao - self.segundos_carga),
+                "carga": self.segundos_carga,
+            },
+            "linhas_por_segundo": self.linhas / total if total else 0.0,
+            "documentos_por_segundo": self.documentos / total if total else 0.0,
+            "latencia_lote_segundos": {
+                "p50": percentil(self.latencias, 50),
+                "p95": percentil(self.latencias, 95),
+                "p99": percentil(self.latencias, 99),
+                "max": max(self.latencias, default=0.0),
+            },
+        }
+
+
+class Metricas:
+    """Métricas de uma execução, compartilhadas pelos passos de todas as threads"""
+
+    PREFIXO = 'rododados_migracao'
+
+    def __init__(self):
+        self.trava = threading.Lock()
+        self.passos = {}
+        self.fases = {}  # segundos de cada fase da execução (carga, índices...)
+        self.inicio = time.time()
+
+    def passo(self, nome):
+        """MedidasPasso de um passo (criado na primeira vez)"""
+        with self.trava:
+            return self.passos.setdefault(nome, MedidasPasso())
+
+    def como_dict(self):
+        return {
+            "inicio": datetime.fromtimestamp(self.inicio).isoformat(),
+            "configuracao": {
+                "modo": MODO,
+                "extracao": EXTRACAO,
+                "paralelismo": PARALELISMO,
+                "pg_fetch": PG_TAMANHO_FETCH,
+                "mongo_lote": MONGO_TAMANHO_LOTE,
+                "mongo_escritores": MONGO_ESCRITORES,
+                "indices": ORDEM_INDICES,
+            },
+            "fases": self.fases,
+            "passos": {nome: medidas.resumo() for nome, medidas in self.passos.items()},
+        }
+
+    def gravar_json(self, caminho):
+        with open(caminho, 'w', encoding='utf-8') as arquivo:
+            json.dump(self.como_dict(), arquivo, indent=2, ensure_ascii=False)
+
+    def gravar_prometheus(self, caminho):
+        """
+        Grava no formato texto do Prometheus.
+
+        O arquivo é escrito ao lado e renomeado, para o textfile collector
+        nunca ler um arquivo pela metade.
+        """
+        p = self.PREFIXO
+        linhas = [
+            f"# HELP {p}_fase_segundos Duração de cada fase da execução",
+            f"# TYPE {p}_fase_segundos gauge",
+        ]
+        linhas += [f'{p}_fase_segundos{{fase="{fase}"}} {segundos}' for fase, segundos in self.fases.items()]
+        
+        resumos = {nome: medidas.resumo() for nome, medidas in self.passos.items()}
+        linhas += [
+            f"# HELP {p}_passo_segundos Tempo de cada passo por etapa (extracao, transformacao, carga)",
+            f"# TYPE {p}_passo_segundos gauge",
+        ]
+        for nome, resumo in resumos.items():
+            for etapa, segundos in resumo["segundos"].items():
+                linhas.append(f'{p}_passo_segundos{{passo="{nome}",etapa="{etapa}"}} {segundos}')
+        
+        for chave, ajuda in [
+            ("linhas", "Linhas lidas do PostgreSQL"),
+            ("documentos", "Documentos gravados no MongoDB"),
+            ("bytes", "Bytes BSON gravados no MongoDB (estimados por amostra)"),
+            ("idas_pg", "Idas ao PostgreSQL (execute e cada fetch)"),
+        ]:
+            linhas += [f"# HELP {p}_{chave} {ajuda}", f"# TYPE {p}_{chave} gauge"]
+            linhas += [f'{p}_{chave}{{passo="{nome}"}} {resumo[chave]}' for nome, resumo in resumos.items()]
+        
+        linhas += [
+            f"# HELP {p}_lote_segundos Latência de cada lote gravado no MongoDB",
+            f"# TYPE {p}_lote_segundos summary",
+        ]
+        for nome, medidas in self.passos.items():
+            for quantil in (50, 95, 99):
+                valor = percentil(medidas.latencias, quantil)
+                linhas.append(f'{p}_lote_segundos{{passo="{nome}",quantile="{quantil / 100}"}} {valor}')
+            linhas.append(f'{p}_lote_segundos_sum{{passo="{nome}"}} {sum(medidas.latencias)}')
+            linhas.append(f'{p}_lote_segundos_count{{passo="{nome}"}} {len(medidas.latencias)}')
+        
+        linhas += [
+            f"# HELP {p}_inicio_timestamp_segundos Início da última execução",
+            f"# TYPE {p}_inicio_timestamp_segundos gauge",
+            f"{p}_inicio_timestamp_segundos {self.inicio}",
+        ]
+        
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            arquivo.write("\n".join(linhas) + "\n")
+        os.replace(temporario, caminho)
+
 
 class Migrador:
     """Classe que faz a migração de PostgreSQL para MongoDB"""
@@ -40,20 +678,31 @@ class Migrador:
     def __init__(self):
         # Conectar ao PostgreSQL
         self.pg_conn = psycopg2.connect(**POSTGRES)
-        self.pg_cursor = self.pg_conn.cursor()
+        # Todas as leituras de um passo enxergam o mesmo snapshot do banco
+        self.pg_conn.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        self.cursores_criados = 0
+        
+        # Blocos a migrar no passo atual (None = tabela inteira)
+        self.blocos_alvo = None
+        # Retomada do passo atual: chaves até ultima_chave já estão gravadas
+        # e o que veio depois pode ter sido gravado em parte
+        self.retomando = False
+        self.ultima_chave = None
+        self.documentos_anteriores = 0
+        # Snapshot exportado para as conexões auxiliares (COPY e threads)
+        self.snapshot = None
+        
+        # Métricas da execução (as threads recebem as do Migrador principal)
+        # e medidas do passo atual
+        self.metricas = Metricas()
+        self.medidas = None
         
         # Conectar ao MongoDB
         self.mongo_client = MongoClient(MONGODB_URI)
         self.mongo_db = self.mongo_client[MONGODB_NOME]
+        # A carga completa em preparação escreve em coleções com sufixo
+        self.sufixo = SUFIXO_PREPARACAO if PREPARACAO and MODO != 'incremental' else ''
         
-        # Dicionários para converter IDs do PostgreSQL para MongoDB
-        self.empresas = {}      # cnpj -> ObjectId
-        self.paradas = {}       # id -> ObjectId
-        self.rotas = {}         # id -> ObjectId
-        self.veiculos = {}      # license_plate -> ObjectId
-        self.passageiros = {}   # cpf -> ObjectId
-        self.funcionarios = {}  # cpf -> ObjectId
-        self.horarios = {}      # id -> ObjectId
     
     def mostrar(self, mensagem, tipo="INFO"):
         """Mostra mensagens no console com ícones"""
@@ -67,13 +716,222 @@ class Migrador:
         icone = icones.get(tipo, "•")
         print(f"[{hora}] {icone} {mensagem}")
     
+    def consultar(self, sql, parametros=None):
+        """
+        Executa uma consulta em um cursor do lado do servidor (named cursor).
+
+        As linhas chegam em blocos de PG_TAMANHO_FETCH enquanto são iteradas,
+        em vez de carregar a tabela inteira com fetchall().
+        """
+        self.cursores_criados += 1
+        cursor = self.pg_conn.cursor(name=f"migracao_{self.cursores_criados}")
+        cursor.itersize = PG_TAMANHO_FETCH
+        cursor.execute(sql, parametros)
+        return self.medir_leitura(self.antecipar(cursor), PG_TAMANHO_FETCH)
+    
+    def extrair(self, sql, parametros, tipos):
+        """
+        Lê uma tabela grande pelo caminho configurado em EXTRACAO.
+
+        Com 'copy' a consulta roda em uma conexão auxiliar que importa o
+        snapshot desta (mesmos dados que os cursores), porque um COPY ocupa
+        a conexão até terminar e as junções leem várias tabelas ao mesmo tempo.
+        """
+        if EXTRACAO != 'copy':
+            return self.consultar(sql, parametros)
+        
+        conexao = psycopg2.connect(**POSTGRES)
+        conexao.set_session(isolation_level='REPEATABLE READ', readonly=True)
+        with conexao.cursor() as cursor:
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", (self.exportar_snapshot(),))
+            sql = cursor.mogrify(sql, parametros).decode()
+        return self.medir_leitura(self.antecipar(LeitorCopy(conexao, sql, tipos)), None)
+    
+    def exportar_snapshot(self):
+        """Exporta (uma vez) o snapshot da transação de pg_conn"""
+        if self.snapshot is None:
+            with self.pg_conn.cursor() as cursor:
+                cursor.execute("SELECT pg_export_snapshot()")
+                self.snapshot = cursor.fetchone()[0]
+        return self.snapshot
+    
+    def importar_snapshot(self, snapshot):
+        """Faz pg_conn ler o snapshot de outro Migrador (antes de qualquer consulta)"""
+        with self.pg_conn.cursor() as cursor:
+            cursor.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        self.snapshot = snapshot
+    
+    def antecipar(self, linhas):
+        """Com PIPELINE, lê as linhas em uma thread à frente de quem as consome"""
+        if not PIPELINE:
+            return linhas
+        return LeituraAntecipada(linhas, PG_TAMANHO_FETCH)
+    
+    def medir_leitura(self, linhas, por_ida):
+        """
+        Repassa as linhas somando nas medidas do passo o tempo de espera.
+
+        Um cursor do lado do servidor faz uma ida ao servidor no execute e
+        outra a cada `por_ida` linhas; um COPY (por_ida=None) é uma só.
+        """
+        medidas = self.medidas
+        if medidas is None:
+            yield from linhas
+            return
+        
+        iterador = iter(linhas)
+        lidas = 0
+        espera = 0.0
+        try:
+            while True:
+                inicio = time.perf_counter()
+                linha = next(iterador, None)
+                espera += time.perf_counter() - inicio
+                if linha is None:
+                    break
+                lidas += 1
+                yield linha
+        finally:
+            idas = 1 if por_ida is None else 2 + lidas // por_ida
+            medidas.registrar_leitura(lidas, idas, espera)
+    
+    def filtro_passo(self, chave):
+        """
+        Cláusula WHERE que limita uma consulta aos blocos do passo atual
+        e, na retomada, às chaves depois da última gravada.
+        """
+        condicoes = []
+        parametros = []
+        if self.blocos_alvo is not None:
+            condicoes.append(f"{sql_bloco(chave)} = ANY(%s)")
+            parametros.append(self.blocos_alvo)
+        if self.ultima_chave is not None:
+            condicoes.append(f"{chave} > %s")
+            parametros.append(self.ultima_chave)
+        if not condicoes:
+            return "", None
+        return "WHERE " + " AND ".join(condicoes), tuple(parametros)
+    
+    def id_para(self, passo, chave):
+        """ObjectId do documento de uma chave do PostgreSQL"""
+        return id_deterministico(passo, chave)
+    
+    def colecao(self, nome):
+        """Coleção onde a migração escreve (a de preparação, se houver)"""
+        return self.mongo_db[nome + self.sufixo]
+    
+    def gravador(self, nome, dependentes=()):
+        """
+        GravadorEmLotes de uma coleção, medido no passo atual.
+
+        O gravador da coleção principal do passo registra a retomada a cada
+        lote confirmado, depois de sincronizar os `dependentes` (coleções
+        cujos documentos acompanham os da principal).
+        """
+        ao_confirmar = None
+        if MODO != 'incremental' and nome in PASSOS:
+            def ao_confirmar(chave, total):
+                for dependente in dependentes:
+                    dependente.sincronizar()
+                self.registrar_retomada(nome, chave, self.documentos_anteriores + total)
+        
+        # Na retomada, lotes gravados depois da última confirmação são regravados
+        # (time-series não aceita upsert: os eventos são apagados antes, em regravar_horarios)
+        substituir = (self.blocos_alvo is not None or self.retomando) and nome != COLECAO_EVENTOS
+        return GravadorEmLotes(
+            self.colecao(nome), substituir=substituir, medidas=self.medidas,
+            ao_confirmar=ao_confirmar
+        )
+    
+    def registrar_retomada(self, passo, chave, documentos, concluido=False):
+        """Grava em COLECAO_EXECUCAO até onde o passo já foi migrado"""
+        self.colecao(COLECAO_EXECUCAO).replace_one({"_id": passo}, {
+            "ultima_chave": chave,
+            "documentos": documentos,
+            "concluido": concluido,
+            "atualizado_em": datetime.now()
+        }, upsert=True)
+    
     def limpar_mongodb(self):
-        """Apaga todos os dados anteriores do MongoDB"""
-        self.mostrar("Limpando MongoDB...", "AVISO")
+        """Apaga todos os dados anteriores do MongoDB (só as sobras de preparação, em preparação)"""
+        if self.sufixo:
+            self.mostrar("Limpando coleções de preparação...", "AVISO")
+        else:
+            self.mostrar("Limpando MongoDB...", "AVISO")
         for colecao in self.mongo_db.list_collection_names():
-            self.mongo_db[colecao].drop()
+            if colecao.endswith(self.sufixo):
+                self.mongo_db[colecao].drop()
         self.mostrar("MongoDB limpo", "OK")
     
+    def colecoes_publicadas(self):
+        """Todas as coleções escritas pela migração, sem sufixo"""
+        colecoes = [colecao for passo in PASSOS for colecao in colecoes_do_passo(passo)]
+        if RESUMOS:
+            colecoes += [COLECAO_RESUMO_ROTAS, COLECAO_RESUMO_PASSAGEIROS]
+        return colecoes
+    
+    def validar_preparacao(self, estatisticas):
+        """
+        Confere as coleções de preparação antes de publicá-las.
+
+        Cada coleção precisa ter um documento por linha da tabela principal
+        no PostgreSQL e exatamente os documentos que a migração gravou. A
+        contagem roda em pg_conn, no mesmo snapshot que os passos leram
+        (as threads importam o snapshot do Migrador principal).
+        """
+        self.mostrar("Validando coleções de preparação...")
+        with self.pg_conn.cursor() as cursor:
+            for passo in PASSOS:
+                cursor.execute(f"SELECT count(*) FROM {FONTES[passo][0][0]}")
+                linhas = cursor.fetchone()[0]
+                documentos = self.colecao(passo).count_documents({})
+                if not linhas == documentos == estatisticas[passo]:
+                    raise RuntimeError(
+                        f"Validação falhou em {passo}: {linhas} linhas no PostgreSQL, "
+                        f"{documentos} documentos na preparação, {estatisticas[passo]} gravados"
+                    )
+        self.mostrar("✓ Coleções de preparação válidas", "OK")
+    
+    def publicar_preparacao(self):
+        """Troca cada coleção publicada pela de preparação (renameCollection atômico)"""
+        self.mostrar("Publicando coleções de preparação...")
+        existentes = set(self.mongo_db.list_collection_names())
+        for nome in self.colecoes_publicadas():
+            if nome + self.sufixo not in existentes:
+                continue
+            if nome == COLECAO_EVENTOS:
+                self.publicar_eventos()
+            else:
+                self.mongo_db[nome + self.sufixo].rename(nome, dropTarget=True)
+        self.mostrar("✓ Coleções publicadas", "OK")
+    
+    def publicar_eventos(self):
+        """
+        Publica a coleção time-series de eventos.
+
+        Coleções time-series não aceitam renameCollection; o conteúdo é
+        copiado com $out (que troca a coleção publicada de uma vez e mantém
+        seus índices) e a de preparação é apagada.
+        """
+        preparacao = self.mongo_db[COLECAO_EVENTOS + self.sufixo]
+        preparacao.aggregate([
+            {"$out": {"db": self.mongo_db.name, "coll": COLECAO_EVENTOS, "timeseries": OPCOES_EVENTOS}}
+        ])
+        preparacao.drop()
+    
+    def criar_colecao_eventos(self):
+        """Cria a coleção time-series de eventos, se ainda não existir"""
+        nome = COLECAO_EVENTOS + self.sufixo
+        if nome not in self.mongo_db.list_collection_names():
+            self.mongo_db.create_collection(nome, timeseries=OPCOES_EVENTOS)
+    
+    def empresas_por_rota(self):
+        """_id das empresas que operam cada rota (CompanyRoute é pequena)"""
+        empresas = {}
+        for id_rota, cnpj in self.consultar("SELECT route_id, cnpj FROM companyroute ORDER BY route_id, cnpj"):
+            empresas.setdefault(id_rota, []).append(self.id_para("empresas", cnpj))
+        return empresas
+    
     def converter_data(self, data):
         """Converte datas do PostgreSQL para formato MongoDB"""
         if data is None:
@@ -86,146 +944,142 @@ class Migrador:
         """Migra tabela Company -> coleção empresas"""
         self.mostrar("Migrando empresas...")
         
-        self.pg_cursor.execute("SELECT cnpj, name FROM company ORDER BY cnpj")
-        empresas = self.pg_cursor.fetchall()
+        filtro, parametros = self.filtro_passo("cnpj")
+        empresas = self.consultar(f"SELECT cnpj, name FROM company {filtro} ORDER BY cnpj", parametros)
         
-        documentos = []
+        gravador = self.gravador("empresas")
         for cnpj, nome in empresas:
-            id_mongo = ObjectId()
-            self.empresas[cnpj] = id_mongo
+            id_mongo = self.id_para("empresas", cnpj)
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
                 "cnpj": cnpj.strip() if cnpj else cnpj,
                 "nome": nome
-            })
+            }, chave=cnpj)
         
-        if documentos:
-            self.mongo_db.empresas.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} empresas migradas", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} empresas migradas", "OK")
+        return gravador.total
     
     def migrar_paradas(self):
         """Migra tabela BusStop -> coleção paradas"""
         self.mostrar("Migrando paradas...")
         
-        self.pg_cursor.execute("SELECT id, name, location FROM busstop ORDER BY id")
-        paradas = self.pg_cursor.fetchall()
+        filtro, parametros = self.filtro_passo("id")
+        paradas = self.consultar(f"SELECT id, name, location FROM busstop {filtro} ORDER BY id", parametros)
         
-        documentos = []
+        gravador = self.gravador("paradas")
         for id_parada, nome, localizacao in paradas:
-            id_mongo = ObjectId()
-            self.paradas[id_parada] = id_mongo
+            id_mongo = self.id_para("paradas", id_parada)
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
                 "nome": nome,
                 "localizacao": localizacao
-            })
+            }, chave=id_parada)
         
-        if documentos:
-            self.mongo_db.paradas.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} paradas migradas", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} paradas migradas", "OK")
+        return gravador.total
     
     def migrar_rotas(self):
         """Migra tabela Route -> coleção rotas"""
         self.mostrar("Migrando rotas...")
         
-        self.pg_cursor.execute("""
+        filtro, parametros = self.filtro_passo("id")
+        rotas = self.consultar(f"""
             SELECT id, origin_id, destination_id, distance
-            FROM route ORDER BY id
-        """)
-        rotas = self.pg_cursor.fetchall()
+            FROM route {filtro} ORDER BY id
+        """, parametros)
+        
+        # Empresas de todas as rotas em uma única consulta, na mesma ordem das rotas
+        filtro, parametros = self.filtro_passo("route_id")
+        empresas_rota = JuncaoOrdenada(self.consultar(f"""
+            SELECT route_id, cnpj FROM companyroute {filtro} ORDER BY route_id, cnpj
+        """, parametros))
         
-        documentos = []
+        gravador = self.gravador("rotas")
         for id_rota, origem_id, destino_id, distancia in rotas:
-            id_mongo = ObjectId()
-            self.rotas[id_rota] = id_mongo
+            id_mongo = self.id_para("rotas", id_rota)
             
-            # Buscar quais empresas operam esta rota
-            self.pg_cursor.execute("""
-                SELECT cnpj FROM companyroute WHERE route_id = %s
-            """, (id_rota,))
-            cnpjs = [linha[0] for linha in self.pg_cursor.fetchall()]
-            empresas_ids = [self.empresas.get(cnpj) for cnpj in cnpjs if cnpj in self.empresas]
+            # Empresas que operam esta rota
+            cnpjs = [cnpj for _, cnpj in empresas_rota.filhos_de(id_rota)]
+            empresas_ids = [self.id_para("empresas", cnpj) for cnpj in cnpjs]
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
-                "origem": self.paradas.get(origem_id),
-                "destino": self.paradas.get(destino_id),
+                "origem": self.id_para("paradas", origem_id),
+                "destino": self.id_para("paradas", destino_id),
                 "distancia_km": distancia,
                 "empresas": empresas_ids
-            })
+            }, chave=id_rota)
         
-        if documentos:
-            self.mongo_db.rotas.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} rotas migradas", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} rotas migradas", "OK")
+        return gravador.total
     
     def migrar_veiculos(self):
         """Migra tabela Vehicle + Seat -> coleção veiculos (com assentos dentro)"""
         self.mostrar("Migrando veículos...")
         
-        self.pg_cursor.execute("""
+        # COLLATE "C" garante a mesma ordem de comparação do Python na junção
+        filtro, parametros = self.filtro_passo('license_plate COLLATE "C"')
+        veiculos = self.consultar(f"""
             SELECT license_plate, brand, model
-            FROM vehicle ORDER BY license_plate
-        """)
-        veiculos = self.pg_cursor.fetchall()
+            FROM vehicle {filtro} ORDER BY license_plate COLLATE "C"
+        """, parametros)
         
-        documentos = []
+        # Assentos de todos os veículos em uma única consulta
+        assentos_veiculo = JuncaoOrdenada(self.extrair(f"""
+            SELECT license_plate, id, seat_row, seat_column
+            FROM seat {filtro}
+            ORDER BY license_plate COLLATE "C", seat_row, seat_column
+        """, parametros, (str, int, str, str)))
+        
+        gravador = self.gravador("veiculos")
         total_assentos = 0
         
         for placa, marca, modelo in veiculos:
-            id_mongo = ObjectId()
-            self.veiculos[placa] = id_mongo
+            id_mongo = self.id_para("veiculos", placa)
             
-            # Obter assentos deste veículo
-            self.pg_cursor.execute("""
-                SELECT id, seat_row, seat_column
-                FROM seat
-                WHERE license_plate = %s
-                ORDER BY seat_row, seat_column
-            """, (placa,))
-            assentos = self.pg_cursor.fetchall()
+            # Assentos deste veículo
+            assentos = assentos_veiculo.filhos_de(placa)
             
             assentos_docs = []
-            for id_assento, fileira, coluna in assentos:
+            for _, id_assento, fileira, coluna in assentos:
                 total_assentos += 1
                 assentos_docs.append({
                     "fileira": fileira.strip() if fileira else fileira,
                     "coluna": coluna.strip() if coluna else coluna
                 })
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
                 "placa": placa.strip() if placa else placa,
                 "marca": marca,
                 "modelo": modelo,
                 "assentos": assentos_docs  # Assentos guardados dentro do veículo
-            })
+            }, chave=placa)
         
-        if documentos:
-            self.mongo_db.veiculos.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} veículos com {total_assentos} assentos", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} veículos com {total_assentos} assentos", "OK")
+        return gravador.total
     
     def migrar_passageiros(self):
         """Migra tabela Passenger -> coleção passageiros"""
         self.mostrar("Migrando passageiros...")
         
-        self.pg_cursor.execute("""
+        filtro, parametros = self.filtro_passo("cpf")
+        passageiros = self.consultar(f"""
             SELECT cpf, first_name, last_name, birthday, email, phone, type_passenger
-            FROM passenger ORDER BY cpf
-        """)
-        passageiros = self.pg_cursor.fetchall()
+            FROM passenger {filtro} ORDER BY cpf
+        """, parametros)
         
-        documentos = []
+        gravador = self.gravador("passageiros")
         for cpf, nome, sobrenome, data_nasc, email, telefone, tipo in passageiros:
-            id_mongo = ObjectId()
-            self.passageiros[cpf] = id_mongo
+            id_mongo = self.id_para("passageiros", cpf)
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
                 "cpf": cpf.strip() if cpf else cpf,
                 "nome": nome,
@@ -234,29 +1088,27 @@ class Migrador:
                 "email": email,
                 "telefone": telefone,
                 "tipo": tipo
-            })
+            }, chave=cpf)
         
-        if documentos:
-            self.mongo_db.passageiros.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} passageiros migrados", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} passageiros migrados", "OK")
+        return gravador.total
     
     def migrar_funcionarios(self):
         """Migra tabela Employee -> coleção funcionarios"""
         self.mostrar("Migrando funcionários...")
         
-        self.pg_cursor.execute("""
+        filtro, parametros = self.filtro_passo("cpf")
+        funcionarios = self.consultar(f"""
             SELECT cpf, first_name, last_name, birthday, email, phone, role, n_license
-            FROM employee ORDER BY cpf
-        """)
-        funcionarios = self.pg_cursor.fetchall()
+            FROM employee {filtro} ORDER BY cpf
+        """, parametros)
         
-        documentos = []
+        gravador = self.gravador("funcionarios")
         for cpf, nome, sobrenome, data_nasc, email, telefone, cargo, licenca in funcionarios:
-            id_mongo = ObjectId()
-            self.funcionarios[cpf] = id_mongo
+            id_mongo = self.id_para("funcionarios", cpf)
             
-            documentos.append({
+            gravador.adicionar({
                 "_id": id_mongo,
                 "cpf": cpf.strip() if cpf else cpf,
                 "nome": nome,
@@ -266,108 +1118,604 @@ class Migrador:
                 "telefone": telefone,
                 "cargo": cargo,
                 "numero_licenca": licenca
-            })
+            }, chave=cpf)
         
-        if documentos:
-            self.mongo_db.funcionarios.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} funcionários migrados", "OK")
-        return len(documentos)
+        gravador.finalizar()
+        self.mostrar(f"✓ {gravador.total} funcionários migrados", "OK")
+        return gravador.total
     
     def migrar_horarios(self):
         """
         Migra Schedule + SeatOnSchedule + Ticket -> coleção horarios
-        (com assentos e tickets dentro)
+        (com assentos e tickets dentro, ou tickets em baldes se
+        LAYOUT_TICKETS = 'baldes', ou assentos em bitmap se
+        LAYOUT_ASSENTOS = 'bitmap')
         """
         self.mostrar("Migrando horários...")
         
-        self.pg_cursor.execute("""
+        filtro, parametros = self.filtro_passo("id")
+        horarios = self.consultar(f"""
             SELECT id, departure_time, arrival_time, travel_time, route_id
-            FROM schedule ORDER BY id
-        """)
-        horarios = self.pg_cursor.fetchall()
+            FROM schedule {filtro} ORDER BY id
+        """, parametros)
+        
+        # Cada tabela filha é lida uma vez, ordenada por horário, e juntada em memória
+        filtro, parametros = self.filtro_passo("schedule_id")
+        funcionarios_horario = JuncaoOrdenada(self.consultar(f"""
+            SELECT schedule_id, employee_cpf FROM scheduleemployee {filtro}
+            ORDER BY schedule_id
+        """, parametros))
+        filtro, parametros = self.filtro_passo("sos.schedule_id")
+        bitmap = LAYOUT_ASSENTOS == 'bitmap'
+        if bitmap:
+            # Posição de cada assento no veículo, na mesma ordem de veiculos.assentos
+            assentos_sql = """(
+                SELECT id, seat_row, seat_column, license_plate,
+                       row_number() OVER (PARTITION BY license_plate ORDER BY seat_row, seat_column) - 1 AS posicao
+                FROM seat
+            )"""
+        else:
+            assentos_sql = "(SELECT *, NULL::int AS posicao FROM seat)"
+        assentos_horario = JuncaoOrdenada(self.extrair(f"""
+            SELECT sos.schedule_id, sos.id, sos.seat_id, sos.is_available, s.seat_row, s.seat_column,
+                   s.license_plate, s.posicao
+            FROM seatonschedule sos
+            JOIN {assentos_sql} s ON s.id = sos.seat_id
+            {filtro}
+            ORDER BY sos.schedule_id, sos.id
+        """, parametros, (int, int, int, bool, str, str, str, int)))
+        tickets_assento = JuncaoOrdenada(self.extrair(f"""
+            SELECT sos.schedule_id, t.seat_on_schedule_id, t.id, t.price, t.passenger_cpf
+            FROM ticket t
+            JOIN seatonschedule sos ON sos.id = t.seat_on_schedule_id
+            {filtro}
+            ORDER BY sos.schedule_id, t.seat_on_schedule_id, t.id
+        """, parametros, (int, int, int, Decimal, str)), chave=lambda linha: (linha[0], linha[1]))
         
-        documentos = []
+        substituir = self.blocos_alvo is not None
         total_tickets = 0
         
+        # Bucket pattern: tickets vão para documentos de tamanho fixo
+        baldes = None
+        if LAYOUT_TICKETS == 'baldes':
+            baldes = self.gravador(COLECAO_BALDES)
+            baldes_obsoletos = []
+        
+        # Ocupação de cada horário, para os relatórios
+        resumos = self.gravador(COLECAO_RESUMO_HORARIOS) if RESUMOS else None
+        
+        # Cada ticket também vira um evento na coleção time-series
+        eventos = None
+        if EVENTOS_TICKETS:
+            self.criar_colecao_eventos()
+            eventos = self.gravador(COLECAO_EVENTOS)
+            empresas_rota = self.empresas_por_rota()
+        # Horários regravados (incremental ou retomada) trocam seus eventos em lotes
+        regravar = [] if eventos is not None and (substituir or self.retomando) else None
+        
+        # Um horário só conta como gravado quando seus baldes, resumo e eventos também estão
+        gravador = self.gravador("horarios", dependentes=[g for g in (baldes, resumos, eventos) if g])
+        
         for id_horario, saida, chegada, tempo_viagem, id_rota in horarios:
-            id_mongo = ObjectId()
-            self.horarios[id_horario] = id_mongo
+            id_mongo = self.id_para("horarios", id_horario)
+            rota = self.id_para("rotas", id_rota)
             
             # Funcionários designados para este horário
-            self.pg_cursor.execute("""
-                SELECT employee_cpf FROM scheduleemployee WHERE schedule_id = %s
-            """, (id_horario,))
-            cpfs_funcionarios = [linha[0] for linha in self.pg_cursor.fetchall()]
-            funcionarios_ids = [self.funcionarios.get(cpf) for cpf in cpfs_funcionarios if cpf in self.funcionarios]
+            cpfs_funcionarios = [cpf for _, cpf in funcionarios_horario.filhos_de(id_horario)]
+            funcionarios_ids = [self.id_para("funcionarios", cpf) for cpf in cpfs_funcionarios]
             
             # Assentos disponíveis neste horário
-            self.pg_cursor.execute("""
-                SELECT sos.id, sos.seat_id, sos.is_available, s.seat_row, s.seat_column
-                FROM seatonschedule sos
-                JOIN seat s ON s.id = sos.seat_id
-                WHERE sos.schedule_id = %s
-            """, (id_horario,))
-            assentos_horario = self.pg_cursor.fetchall()
-            
             assentos_docs = []
-            for id_sos, id_assento, disponivel, fileira, coluna in assentos_horario:
+            tickets_horario = []
+            placa = None
+            livres = []
+            posicoes = 0
+            vendidos = 0
+            receita = 0
+            eventos_horario = []
+            for _, id_sos, id_assento, disponivel, fileira, coluna, placa_assento, posicao in \
+                    assentos_horario.filhos_de(id_horario):
                 # Tickets vendidos para este assento
-                self.pg_cursor.execute("""
-                    SELECT id, price, passenger_cpf
-                    FROM ticket WHERE seat_on_schedule_id = %s
-                """, (id_sos,))
-                tickets = self.pg_cursor.fetchall()
+                tickets = tickets_assento.filhos_de((id_horario, id_sos))
                 
                 tickets_docs = []
-                for id_ticket, preco, cpf_passageiro in tickets:
+                for _, _, id_ticket, preco, cpf_passageiro in tickets:
                     total_tickets += 1
+                    vendidos += 1
+                    receita += preco or 0
                     tickets_docs.append({
                         "preco": float(preco) if preco else None,
-                        "passageiro": self.passageiros.get(cpf_passageiro)
+                        "passageiro": self.id_para("passageiros", cpf_passageiro)
                     })
+                    if eventos is not None:
+                        # O esquema não guarda a hora da venda: o evento usa a saída do horário
+                        eventos_horario.append({
+                            "_id": self.id_para(COLECAO_EVENTOS, id_ticket),
+                            "momento": saida,
+                            "meta": {"rota": rota, "empresas": empresas_rota.get(id_rota, [])},
+                            "horario": id_mongo,
+                            **tickets_docs[-1]
+                        })
                 
-                assentos_docs.append({
+                assento = {
                     "fileira": fileira.strip() if fileira else fileira,
                     "coluna": coluna.strip() if coluna else coluna,
-                    "disponivel": disponivel,
-                    "tickets": tickets_docs  # Tickets dentro de cada assento
-                })
+                    "disponivel": disponivel
+                }
+                if baldes is None and not bitmap:
+                    assento["tickets"] = tickets_docs  # Tickets dentro de cada assento
+                else:
+                    local = {"fileira": assento["fileira"], "coluna": assento["coluna"]}
+                    if bitmap:
+                        local["assento"] = posicao
+                    tickets_horario.extend({**local, **ticket} for ticket in tickets_docs)
+                if bitmap:
+                    placa = placa or placa_assento
+                    posicoes = max(posicoes, posicao + 1)
+                    if disponivel:
+                        livres.append(posicao)
+                assentos_docs.append(assento)
             
-            documentos.append({
+            documento = {
                 "_id": id_mongo,
                 "hora_saida": saida,
                 "hora_chegada": chegada,
                 "tempo_viagem": str(tempo_viagem),
-                "rota": self.rotas.get(id_rota),
-                "funcionarios": funcionarios_ids,
-                "assentos": assentos_docs
+                "rota": rota,
+                "funcionarios": funcionarios_ids
+            }
+            if bitmap:
+                # Bit N = N-ésimo assento de veiculos.assentos; leitura e troca de tamanho fixo
+                documento["veiculo"] = self.id_para("veiculos", placa)
+                documento["assentos_total"] = len(assentos_docs)
+                documento["assentos_disponiveis"] = len(livres)
+                documento["disponiveis"] = codificar_mapa(livres, posicoes)
+                if baldes is None:
+                    documento["tickets"] = tickets_horario
+            else:
+                documento["assentos"] = assentos_docs
+            
+            disponiveis = sum(1 for assento in assentos_docs if assento["disponivel"])
+            if baldes is not None:
+                quantidade_baldes = self.gravar_baldes(baldes, id_horario, id_mongo, tickets_horario)
+                documento["resumo"] = {
+                    "assentos": len(assentos_docs),
+                    "assentos_disponiveis": disponiveis,
+                    "tickets": vendidos,
+                    "receita": float(round(receita, 2)),
+                    "baldes": quantidade_baldes
+                }
+                # Na reescrita incremental, baldes além do último atual sobraram da versão anterior
+                if substituir:
+                    baldes_obsoletos.append({"horario": id_mongo, "seq": {"$gte": quantidade_baldes}})
+                    if len(baldes_obsoletos) >= MONGO_TAMANHO_LOTE:
+                        self.remover_baldes_obsoletos(baldes_obsoletos)
+                        baldes_obsoletos = []
+            
+            if resumos is not None:
+                resumos.adicionar({
+                    "_id": id_mongo,
+                    "rota": rota,
+                    "dia": datetime.combine(saida.date(), datetime.min.time()) if saida else None,
+                    "hora_saida": saida,
+                    "assentos": len(assentos_docs),
+                    "ocupados": len(assentos_docs) - disponiveis,
+                    "ocupacao": round((len(assentos_docs) - disponiveis) / len(assentos_docs), 4) if assentos_docs else 0.0,
+                    "tickets": vendidos,
+                    "receita": float(round(receita, 2))
+                })
+            
+            if regravar is not None:
+                regravar.append((documento, id_horario, eventos_horario))
+                if len(regravar) >= MONGO_TAMANHO_LOTE:
+                    self.regravar_horarios(gravador, eventos, regravar)
+                    regravar = []
+                continue
+            for evento in eventos_horario:
+                eventos.adicionar(evento)
+            gravador.adicionar(documento, chave=id_horario)
+        
+        if regravar:
+            self.regravar_horarios(gravador, eventos, regravar)
+        gravador.finalizar()
+        if eventos is not None:
+            eventos.finalizar()
+        if resumos is not None:
+            resumos.finalizar()
+        if baldes is not None:
+            baldes.finalizar()
+            if substituir and baldes_obsoletos:
+                self.remover_baldes_obsoletos(baldes_obsoletos)
+        self.mostrar(f"✓ {gravador.total} horários com {total_tickets} tickets", "OK")
+        return gravador.total
+    
+    def remover_baldes_obsoletos(self, filtros):
+        """Apaga baldes que sobraram da versão anterior de horários regravados"""
+        self.colecao(COLECAO_BALDES).delete_many({"$or": filtros})
+    
+    def regravar_horarios(self, gravador, eventos, pendentes):
+        """
+        Grava horários que já podem existir no MongoDB, com seus eventos.
+
+        Time-series não aceita upsert: os eventos antigos desses horários são
+        apagados e os novos inseridos antes de cada horário, para que um
+        horário confirmado na retomada nunca fique sem seus eventos.
+        """
+        self.remover_eventos([documento["_id"] for documento, _, _ in pendentes])
+        for documento, id_horario, eventos_horario in pendentes:
+            for evento in eventos_horario:
+                eventos.adicionar(evento)
+            gravador.adicionar(documento, chave=id_horario)
+    
+    def remover_eventos(self, horarios):
+        """Apaga os eventos de tickets dos horários"""
+        self.colecao(COLECAO_EVENTOS).delete_many({"horario": {"$in": horarios}})
+    
+    def gravar_baldes(self, baldes, id_horario, id_mongo, tickets):
+        """
+        Divide os tickets de um horário em baldes de TICKETS_POR_BALDE.
+
+        Cada balde é identificado por (horario, seq); devolve quantos foram gerados.
+        """
+        quantidade = 0
+        for inicio in range(0, len(tickets), TICKETS_POR_BALDE):
+            parte = tickets[inicio:inicio + TICKETS_POR_BALDE]
+            baldes.adicionar({
+                "_id": self.id_para(COLECAO_BALDES, f"{id_horario}:{quantidade}"),
+                "horario": id_mongo,
+                "seq": quantidade,
+                "quantidade": len(parte),
+                "tickets": parte
             })
+            quantidade += 1
+        return quantidade
+    
+    def indices(self):
+        """Índices secundários: (coleção, chaves, opções)"""
+        indices = [
+            # Índices únicos (não podem repetir)
+            ("empresas", "cnpj", {"unique": True}),
+            ("paradas", "localizacao", {"unique": True}),
+            ("veiculos", "placa", {"unique": True}),
+            ("passageiros", "cpf", {"unique": True}),
+            ("passageiros", "email", {"unique": True}),
+            ("funcionarios", "cpf", {"unique": True}),
+            ("funcionarios", "email", {"unique": True}),
+            
+            # Índices normais (para buscas rápidas)
+            ("empresas", "nome", {}),
+            ("rotas", [("origem", 1), ("destino", 1)], {}),
+            ("horarios", "rota", {}),
+            ("horarios", "hora_saida", {}),
+        ]
+        if LAYOUT_TICKETS == 'baldes':
+            indices.append((COLECAO_BALDES, [("horario", 1), ("seq", 1)], {"unique": True}))
+        if RESUMOS:
+            indices += [
+                (COLECAO_RESUMO_HORARIOS, [("rota", 1), ("dia", 1)], {}),
+                (COLECAO_RESUMO_ROTAS, "dia", {}),
+                (COLECAO_RESUMO_ROTAS, [("rota", 1), ("dia", 1)], {"unique": True}),
+                (COLECAO_RESUMO_PASSAGEIROS, [("gasto", -1)], {}),
+            ]
+        if EVENTOS_TICKETS:
+            # O índice (meta, momento) já é criado com a coleção; a coleção
+            # time-series não tem índice em _id, então as buscas e remoções
+            # por horário usam o índice de horario
+            indices += [
+                (COLECAO_EVENTOS, "horario", {}),
+                (COLECAO_EVENTOS, "momento", {}),
+                (COLECAO_EVENTOS, [("meta.empresas", 1), ("momento", 1)], {}),
+            ]
+        return indices
+    
+    def criar_indices(self, colecoes=None):
+        """Cria índices para buscas rápidas (só os de `colecoes`, se indicadas)"""
+        if colecoes is None:
+            self.mostrar("Criando índices...")
+        if EVENTOS_TICKETS and (colecoes is None or COLECAO_EVENTOS in colecoes):
+            self.criar_colecao_eventos()
+        
+        for nome, chaves, opcoes in self.indices():
+            if colecoes is None or nome in colecoes:
+                self.colecao(nome).create_index(chaves, **opcoes)
         
-        if documentos:
-            self.mongo_db.horarios.insert_many(documentos)
-        self.mostrar(f"✓ {len(documentos)} horários com {total_tickets} tickets", "OK")
-        return len(documentos)
+        if colecoes is None:
+            self.mostrar("✓ Índices criados", "OK")
     
-    def criar_indices(self):
-        """Cria índices para buscas rápidas"""
-        self.mostrar("Criando índices...")
+    def agregacoes_resumos(self):
+        """
+        Agregações que geram os resumos por rota/dia e por passageiro:
+        (coleção de origem, pipeline sem o $out, coleção de destino).
+        """
+        # Receita e ocupação por rota por dia, a partir do resumo de cada horário
+        rotas = [
+            {"$group": {
+                "_id": {"rota": "$rota", "dia": "$dia"},
+                "horarios": {"$sum": 1},
+                "tickets": {"$sum": "$tickets"},
+                "receita": {"$sum": "$receita"},
+                "assentos": {"$sum": "$assentos"},
+                "ocupados": {"$sum": "$ocupados"}
+            }},
+            {"$set": {"rota": "$_id.rota", "dia": "$_id.dia"}},
+        ]
         
-        # Índices únicos (não podem repetir)
-        self.mongo_db.empresas.create_index("cnpj", unique=True)
-        self.mongo_db.paradas.create_index("localizacao", unique=True)
-        self.mongo_db.veiculos.create_index("placa", unique=True)
-        self.mongo_db.passageiros.create_index("cpf", unique=True)
-        self.mongo_db.passageiros.create_index("email", unique=True)
-        self.mongo_db.funcionarios.create_index("cpf", unique=True)
-        self.mongo_db.funcionarios.create_index("email", unique=True)
+        # Tickets e gasto por passageiro, de onde os tickets estiverem guardados
+        if LAYOUT_TICKETS == 'baldes':
+            origem, desdobrar = COLECAO_BALDES, [{"$unwind": "$tickets"}, {"$replaceWith": "$tickets"}]
+        elif LAYOUT_ASSENTOS == 'bitmap':
+            origem, desdobrar = "horarios", [{"$unwind": "$tickets"}, {"$replaceWith": "$tickets"}]
+        else:
+            origem, desdobrar = "horarios", [
+                {"$unwind": "$assentos"},
+                {"$unwind": "$assentos.tickets"},
+                {"$replaceWith": "$assentos.tickets"}
+            ]
+        passageiros = [
+            {"$project": {"tickets": 1, "assentos.tickets": 1}},
+            *desdobrar,
+            {"$group": {
+                "_id": "$passageiro",
+                "tickets": {"$sum": 1},
+                "gasto": {"$sum": "$preco"}
+            }},
+            {"$set": {"gasto": {"$round": ["$gasto", 2]}}},
+        ]
+        return [
+            (COLECAO_RESUMO_HORARIOS, rotas, COLECAO_RESUMO_ROTAS),
+            (origem, passageiros, COLECAO_RESUMO_PASSAGEIROS),
+        ]
+    
+    def criar_resumos(self):
+        """
+        Gera os resumos por rota/dia e por passageiro dentro do MongoDB.
+
+        As agregações terminam em $out, que troca a coleção inteira de uma vez:
+        grupos que deixaram de existir somem e os índices são mantidos.
+        """
+        self.mostrar("Gerando resumos...")
         
-        # Índices normais (para buscas rápidas)
-        self.mongo_db.empresas.create_index("nome")
-        self.mongo_db.rotas.create_index([("origem", 1), ("destino", 1)])
-        self.mongo_db.horarios.create_index("rota")
-        self.mongo_db.horarios.create_index("hora_saida")
+        for origem, pipeline, destino in self.agregacoes_resumos():
+            self.colecao(origem).aggregate(
+                [*pipeline, {"$out": destino + self.sufixo}], allowDiskUse=True
+            )
         
-        self.mostrar("✓ Índices criados", "OK")
+        rotas = self.colecao(COLECAO_RESUMO_ROTAS).estimated_document_count()
+        passageiros = self.colecao(COLECAO_RESUMO_PASSAGEIROS).estimated_document_count()
+        self.mostrar(f"✓ Resumos de {rotas} rotas/dia e {passageiros} passageiros", "OK")
+    
+    def medir(self, funcao):
+        """Executa uma função e devolve (resultado, segundos)"""
+        inicio = time.perf_counter()
+        resultado = funcao()
+        return resultado, time.perf_counter() - inicio
+    
+    def fechar(self):
+        """Fecha as conexões com os bancos"""
+        self.pg_conn.close()
+        self.mongo_client.close()
+    
+    def blocos_postgres(self, passo, blocos=None, com_chaves=False):
+        """
+        Calcula no PostgreSQL o hash de conteúdo de cada bloco de um passo.
+
+        Gera (bloco, hash, chaves) em ordem de bloco por um cursor do lado do
+        servidor; as chaves da tabela principal só vêm com `com_chaves` (senão
+        None) e `blocos` limita a consulta a esses blocos. Só os hashes e as
+        chaves trafegam pela rede, não as linhas.
+        """
+        partes = []
+        for posicao, (origem, chave, linha) in enumerate(FONTES[passo]):
+            principal = "true" if posicao == 0 else "false"
+            partes.append(
+                f"SELECT {sql_bloco(chave)} AS bloco, {chave} AS chave, "
+                f"{linha} AS linha, {principal} AS principal FROM {origem}"
+            )
+        chaves = "array_agg(chave) FILTER (WHERE principal)" if com_chaves else "NULL"
+        filtro = "WHERE bloco = ANY(%s)" if blocos is not None else ""
+        return self.consultar(f"""
+            SELECT bloco, md5(string_agg(linha, '|' ORDER BY linha)), {chaves}
+            FROM ({' UNION ALL '.join(partes)}) AS fontes
+            {filtro}
+            GROUP BY bloco
+            ORDER BY bloco
+        """, (list(blocos),) if blocos is not None else None)
+    
+    def remover_documentos(self, passo, removidos):
+        """Apaga os documentos de chaves que não existem mais (e o que depende deles)"""
+        self.colecao(passo).delete_many({"_id": {"$in": removidos}})
+        if passo == 'horarios' and LAYOUT_TICKETS == 'baldes':
+            self.colecao(COLECAO_BALDES).delete_many({"horario": {"$in": removidos}})
+        if passo == 'horarios' and RESUMOS:
+            self.colecao(COLECAO_RESUMO_HORARIOS).delete_many({"_id": {"$in": removidos}})
+        if passo == 'horarios' and EVENTOS_TICKETS:
+            self.remover_eventos(removidos)
+    
+    def atualizar_controle(self, passo, alterados):
+        """
+        Grava o hash e as chaves dos blocos alterados e apaga os documentos
+        de chaves que sumiram deles.
+
+        Os blocos chegam do PostgreSQL em streaming e são tratados em grupos
+        de BLOCOS_POR_LOTE, então só as chaves de um grupo ficam em memória.
+        """
+        controle = self.colecao(COLECAO_CONTROLE)
+        pendentes = set(alterados)
+        removidos_total = 0
+        
+        def gravar(grupo):
+            nonlocal removidos_total
+            anteriores = {
+                doc["bloco"]: doc.get("chaves", [])
+                for doc in controle.find({"passo": passo, "bloco": {"$in": [bloco for bloco, _, _ in grupo]}})
+            }
+            removidos = []
+            operacoes = []
+            for bloco, hash_bloco, chaves in grupo:
+                atuais = set(chaves)
+                removidos.extend(
+                    self.id_para(passo, chave) for chave in anteriores.get(bloco, []) if chave not in atuais
+                )
+                if hash_bloco is None:
+                    operacoes.append(DeleteOne({"_id": f"{passo}:{bloco}"}))
+                else:
+                    operacoes.append(ReplaceOne({"_id": f"{passo}:{bloco}"}, {
+                        "passo": passo,
+                        "bloco": bloco,
+                        "hash": hash_bloco,
+                        "chaves": chaves
+                    }, upsert=True))
+            if removidos:
+                self.remover_documentos(passo, removidos)
+                removidos_total += len(removidos)
+            controle.bulk_write(operacoes, ordered=False)
+        
+        grupo = []
+        for bloco, hash_bloco, chaves in self.blocos_postgres(passo, sorted(alterados), com_chaves=True):
+            pendentes.discard(bloco)
+            grupo.append((bloco, hash_bloco, chaves or []))
+            if len(grupo) >= BLOCOS_POR_LOTE:
+                gravar(grupo)
+                grupo = []
+        # Blocos que não têm mais nenhuma linha
+        grupo.extend((bloco, None, []) for bloco in sorted(pendentes))
+        for inicio in range(0, len(grupo), BLOCOS_POR_LOTE):
+            gravar(grupo[inicio:inicio + BLOCOS_POR_LOTE])
+        
+        if removidos_total:
+            self.mostrar(f"{passo}: {removidos_total} documentos removidos", "AVISO")
+    
+    def migrar_passo(self, passo):
+        """
+        Migra um passo e, no modo incremental, registra o hash e as chaves
+        de cada bloco.
+
+        No modo incremental só os blocos cujo hash mudou são relidos e
+        gravados com upsert; documentos de chaves que sumiram são apagados.
+        Sem controle anterior a coleção é recarregada inteira. Como os _id
+        são determinísticos, as referências das outras coleções continuam
+        válidas em qualquer caso. O modo completo não calcula hashes.
+        """
+        self.medidas = self.metricas.passo(passo)
+        inicio = time.perf_counter()
+        
+        # Retomada de uma migração completa interrompida
+        if MODO != 'incremental':
+            retomada = self.colecao(COLECAO_EXECUCAO).find_one({"_id": passo})
+            if retomada and retomada["concluido"]:
+                self.mostrar(f"{passo}: já migrado na execução anterior", "OK")
+                return retomada["documentos"]
+            if retomada:
+                self.retomando = True
+                self.ultima_chave = retomada["ultima_chave"]
+                self.documentos_anteriores = retomada["documentos"]
+                ponto = "do início" if self.ultima_chave is None else f"depois da chave {self.ultima_chave}"
+                self.mostrar(f"{passo}: retomando {ponto}", "AVISO")
+            else:
+                # Marca o passo como iniciado: se cair antes do primeiro lote
+                # confirmado, a retomada regrava tudo com upsert
+                self.registrar_retomada(passo, None, 0)
+        
+        alterados = None  # None = tabela inteira
+        if MODO == 'incremental':
+            # Só bloco e hash (BLOCOS entradas), sem as chaves
+            anteriores = {
+                doc["bloco"]: doc["hash"]
+                for doc in self.colecao(COLECAO_CONTROLE).find({"passo": passo}, {"bloco": 1, "hash": 1})
+            }
+            atuais = {bloco: hash_bloco for bloco, hash_bloco, _ in self.blocos_postgres(passo)}
+            if not anteriores:
+                self.mostrar(f"{passo}: sem controle anterior, recarga completa", "AVISO")
+                for colecao in colecoes_do_passo(passo):
+                    self.colecao(colecao).drop()
+                # Os índices criados antes da carga foram junto com as coleções
+                if ORDEM_INDICES == 'antes':
+                    self.criar_indices(colecoes_do_passo(passo))
+                alterados = set(atuais)
+            else:
+                alterados = {
+                    bloco for bloco, hash_bloco in atuais.items() if anteriores.get(bloco) != hash_bloco
+                } | (set(anteriores) - set(atuais))
+                self.blocos_alvo = sorted(alterados)
+                self.mostrar(f"{passo}: {len(alterados)} de {len(atuais)} blocos alterados")
+        
+        total = getattr(self, f"migrar_{passo}")() if alterados is None or alterados else 0
+        total += self.documentos_anteriores
+        self.blocos_alvo = None
+        self.retomando = False
+        self.ultima_chave = None
+        self.documentos_anteriores = 0
+        
+        # Apagar documentos de chaves que não existem mais e atualizar o controle
+        if alterados:
+            self.atualizar_controle(passo, alterados)
+        if MODO != 'incremental':
+            self.registrar_retomada(passo, None, total, concluido=True)
+        self.medidas.segundos_total += time.perf_counter() - inicio
+        self.medidas = None
+        return total
+    
+    def executar_passo(self, nome):
+        """Executa um passo com conexões próprias (usado pelas threads)"""
+        auxiliar = type(self)()
+        auxiliar.metricas = self.metricas
+        try:
+            auxiliar.importar_snapshot(self.snapshot)
+            return auxiliar.migrar_passo(nome)
+        finally:
+            auxiliar.fechar()
+    
+    def migrar_colecoes(self):
+        """
+        Executa os passos de PASSOS respeitando as dependências.
+
+        Passos independentes rodam ao mesmo tempo em um pool de threads,
+        cada um com suas conexões; um passo só começa quando os passos
+        dos quais ele depende terminaram. As conexões das threads importam o
+        snapshot da principal, então todos os passos (e a validação da
+        preparação) enxergam os mesmos dados.
+        """
+        if PARALELISMO <= 1:
+            return {nome: self.migrar_passo(nome) for nome in PASSOS}
+        
+        self.exportar_snapshot()
+        estatisticas = {}
+        pendentes = dict(PASSOS)
+        em_execucao = {}
+        with ThreadPoolExecutor(max_workers=PARALELISMO) as executor:
+            while pendentes or em_execucao:
+                # Iniciar todos os passos cujas dependências já terminaram
+                for nome, dependencias in list(pendentes.items()):
+                    if all(dependencia in estatisticas for dependencia in dependencias):
+                        em_execucao[executor.submit(self.executar_passo, nome)] = nome
+                        del pendentes[nome]
+                
+                concluidos, _ = wait(em_execucao, return_when=FIRST_COMPLETED)
+                for futuro in concluidos:
+                    estatisticas[em_execucao.pop(futuro)] = futuro.result()
+        
+        return {nome: estatisticas[nome] for nome in PASSOS}
+    
+    def mostrar_metricas(self, tempos, tempo):
+        """Mostra extração/transformação/carga de cada passo e grava os arquivos de métricas"""
+        self.metricas.fases.update(tempos, total=tempo)
+        print("\n   Passo          extração  transf.  carga   linhas/s   docs/s  MB      idas PG  p95 lote")
+        for nome, medidas in self.metricas.passos.items():
+            resumo = medidas.resumo()
+            segundos = resumo["segundos"]
+            print(
+                f"   {nome:13s} {segundos['extracao']:8.2f}s {segundos['transformacao']:7.2f}s "
+                f"{segundos['carga']:6.2f}s {resumo['linhas_por_segundo']:9.0f} "
+                f"{resumo['documentos_por_segundo']:8.0f} {resumo['bytes'] / 1e6:7.2f} "
+                f"{resumo['idas_pg']:7d} {resumo['latencia_lote_segundos']['p95'] * 1000:6.1f}ms"
+            )
+        
+        if METRICAS_JSON:
+            self.metricas.gravar_json(METRICAS_JSON)
+            self.mostrar(f"Métricas gravadas em {METRICAS_JSON}")
+        if METRICAS_PROMETHEUS:
+            self.metricas.gravar_prometheus(METRICAS_PROMETHEUS)
+            self.mostrar(f"Métricas Prometheus gravadas em {METRICAS_PROMETHEUS}")
     
     def executar(self):
         """Executa toda a migração passo a passo"""
@@ -378,23 +1726,47 @@ class Migrador:
             print("="*60)
             print(f"Início: {inicio.strftime('%Y-%m-%d %H:%M:%S')}\n")
             
-            # 1. Limpar MongoDB
-            self.limpar_mongodb()
+            # 1. Limpar MongoDB (o modo incremental reaproveita o que já existe
+            #    e a preparação não toca nas coleções publicadas)
+            if MODO == 'incremental':
+                self.mostrar("Modo incremental: só blocos alterados serão migrados")
+            elif RETOMAR and self.colecao(COLECAO_EXECUCAO).count_documents({}):
+                self.mostrar("Retomando a migração interrompida", "AVISO")
+            else:
+                self.limpar_mongodb()
             print()
             
-            # 2. Migrar dados (em ordem de dependências)
-            estatisticas = {}
-            estatisticas['empresas'] = self.migrar_empresas()
-            estatisticas['paradas'] = self.migrar_paradas()
-            estatisticas['rotas'] = self.migrar_rotas()
-            estatisticas['veiculos'] = self.migrar_veiculos()
-            estatisticas['passageiros'] = self.migrar_passageiros()
-            estatisticas['funcionarios'] = self.migrar_funcionarios()
-            estatisticas['horarios'] = self.migrar_horarios()
+            # 2. Migrar dados (em ordem de dependências), com os índices
+            #    criados antes ou depois da carga conforme ORDEM_INDICES
+            tempos = {}
+            if ORDEM_INDICES == 'antes':
+                _, tempos['indices'] = self.medir(self.criar_indices)
+                print()
+            
+            estatisticas, tempos['carga'] = self.medir(self.migrar_colecoes)
             
             # 3. Criar índices
-            print()
-            self.criar_indices()
+            if ORDEM_INDICES != 'antes':
+                print()
+                _, tempos['indices'] = self.medir(self.criar_indices)
+            
+            # 3a. Agregar os resumos para relatórios a partir do que foi carregado
+            if RESUMOS:
+                print()
+                _, tempos['resumos'] = self.medir(self.criar_resumos)
+            
+            # 3b. Validar e publicar as coleções de preparação
+            if self.sufixo:
+                print()
+                self.validar_preparacao(estatisticas)
+                self.publicar_preparacao()
+            
+            # A execução terminou: a próxima começa do zero. A carga completa
+            # não calcula hashes, então o controle de blocos anterior não vale
+            # mais e a próxima execução incremental recarrega tudo
+            if MODO != 'incremental':
+                self.colecao(COLECAO_EXECUCAO).drop()
+                self.mongo_db[COLECAO_CONTROLE].drop()
             
             # 4. Mostrar resumo
             fim = datetime.now()
@@ -406,6 +1778,11 @@ class Migrador:
             for colecao, quantidade in estatisticas.items():
                 print(f"  • {colecao:15s}: {quantidade:4d} documentos")
             print(f"\n⏱️  Tempo: {tempo:.2f} segundos")
+            print(f"   • Carga:   {tempos['carga']:.2f} s")
+            print(f"   • Índices: {tempos['indices']:.2f} s (criados {ORDEM_INDICES} da carga)")
+            if RESUMOS:
+                print(f"   • Resumos: {tempos['resumos']:.2f} s")
+            self.mostrar_metricas(tempos, tempo)
             print("="*60)
             print("✅ Migração concluída!\n")
             
@@ -416,9 +1793,7 @@ class Migrador:
             raise
         finally:
             # Fechar conexões
-            self.pg_cursor.close()
-            self.pg_conn.close()
-            self.mongo_client.close()
+            self.fechar()
 
 
 # === PONTO DE INÍCIO ===
@@ -0,0 +1,158 @@
+"""
+Testes dos estágios do pipeline (MIGRAR_PIPELINE=1), sem bancos de dados:
+a fila limitada segura quem produz e os erros de cada estágio chegam a
+quem consome.
+
+    cd migracion && python -m pytest -q test_pipeline.py
+"""
+
+import threading
+import time
+import unittest
+
+from migrar import GravadorEmLotes, LeituraAntecipada
+
+
+def esperar(condicao, limite=2.0):
+    """Espera `condicao()` ficar verdadeira (ou o limite em segundos)"""
+    fim = time.monotonic() + limite
+    while not condicao() and time.monotonic() < fim:
+        time.sleep(0.01)
+    return condicao()
+
+
+class Linhas:
+    """Gera linhas contando quantas já foram lidas; pode falhar no meio"""
+
+    def __init__(self, total, falhar_em=None):
+        self.total = total
+        self.falhar_em = falhar_em
+        self.lidas = 0
+
+    def __iter__(self):
+        for linha in range(self.total):
+            if linha == self.falhar_em:
+                raise RuntimeError("conexão perdida")
+            self.lidas += 1
+            yield (linha,)
+
+
+class Cursor(Linhas):
+    """Como um cursor do psycopg2: entrega blocos com fetchmany"""
+
+    def __init__(self, total, falhar_em=None):
+        super().__init__(total, falhar_em)
+        self.linhas = iter(self)
+        self.fetches = 0
+
+    def fetchmany(self, tamanho):
+        self.fetches += 1
+        bloco = []
+        for linha in self.linhas:
+            bloco.append(linha)
+            if len(bloco) == tamanho:
+                break
+        return bloco
+
+
+class ColecaoLenta:
+    """Coleção em que cada insert_many espera `liberar` (ou falha)"""
+
+    def __init__(self, falhar=False):
+        self.liberar = threading.Event()
+        self.falhar = falhar
+        self.documentos = []
+
+    def with_options(self, **opcoes):
+        return self
+
+    def insert_many(self, lote, ordered=True):
+        self.liberar.wait()
+        if self.falhar:
+            raise RuntimeError("MongoDB fora do ar")
+        self.documentos.extend(lote)
+
+
+class TestLeituraAntecipada(unittest.TestCase):
+
+    def test_entrega_todas_as_linhas_em_ordem(self):
+        for linhas in (Linhas(1050), Cursor(1050)):
+            lidas = list(LeituraAntecipada(linhas, tamanho_bloco=100, blocos=2))
+            self.assertEqual(lidas, [(n,) for n in range(1050)])
+
+    def test_cursor_lido_um_bloco_por_fetch(self):
+        cursor = Cursor(1050)
+        list(LeituraAntecipada(cursor, tamanho_bloco=100, blocos=2))
+        # 11 blocos e um fetch vazio no fim
+        self.assertEqual(cursor.fetches, 12)
+
+    def test_fila_cheia_segura_a_leitura(self):
+        for linhas in (Linhas(100000), Cursor(100000)):
+            leitura = iter(LeituraAntecipada(linhas, tamanho_bloco=100, blocos=3))
+            next(leitura)
+            esperar(lambda: linhas.lidas >= 300)
+            time.sleep(0.2)
+            # Bloco sendo consumido + 3 na fila + 1 esperando lugar na fila
+            self.assertLessEqual(linhas.lidas, (3 + 2) * 100)
+            leitura.close()
+
+    def test_consumidor_parar_encerra_a_thread(self):
+        antes = threading.active_count()
+        leitura = iter(LeituraAntecipada(Linhas(100000), tamanho_bloco=100, blocos=1))
+        next(leitura)
+        leitura.close()
+        self.assertTrue(esperar(lambda: threading.active_count() == antes))
+
+    def test_erro_na_leitura_chega_ao_consumidor(self):
+        for linhas in (Linhas(1000, falhar_em=550), Cursor(1000, falhar_em=550)):
+            lidas = []
+            with self.assertRaisesRegex(RuntimeError, "conexão perdida"):
+                for linha in LeituraAntecipada(linhas, tamanho_bloco=100, blocos=2):
+                    lidas.append(linha)
+            # Os blocos completos antes do erro foram entregues
+            self.assertEqual(lidas[:500], [(n,) for n in range(500)])
+
+
+class TestGravadorEmLotes(unittest.TestCase):
+
+    def test_lotes_em_espera_seguram_a_montagem(self):
+        colecao = ColecaoLenta()
+        gravador = GravadorEmLotes(colecao, tamanho=10, escritores=2, em_espera=2)
+        montados = []
+
+        def montar():
+            for n in range(200):
+                gravador.adicionar({"_id": n}, chave=n)
+                montados.append(n)
+
+        thread = threading.Thread(target=montar, daemon=True)
+        thread.start()
+        esperar(lambda: len(montados) >= 40)
+        time.sleep(0.2)
+        # 2 escritores x 2 lotes em espera; o próximo lote fica parado
+        self.assertEqual(len(gravador.pendentes), 4)
+        self.assertLess(len(montados), 50)
+
+        colecao.liberar.set()
+        thread.join(timeout=5)
+        gravador.finalizar()
+        self.assertEqual(gravador.total, 200)
+        self.assertEqual(sorted(doc["_id"] for doc in colecao.documentos), list(range(200)))
+
+    def test_erro_na_gravacao_chega_a_montagem(self):
+        colecao = ColecaoLenta(falhar=True)
+        colecao.liberar.set()
+        confirmadas = []
+        gravador = GravadorEmLotes(
+            colecao, tamanho=10, escritores=2,
+            ao_confirmar=lambda chave, total: confirmadas.append(chave)
+        )
+        with self.assertRaisesRegex(RuntimeError, "MongoDB fora do ar"):
+            for n in range(100):
+                gravador.adicionar({"_id": n}, chave=n)
+            gravador.finalizar()
+        self.assertEqual(confirmadas, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+VERIFICAÇÃO DA MIGRAÇÃO POSTGRESQL -> MONGODB
+=============================================
+Confere se o MongoDB tem exatamente o que a migração geraria a partir
+do PostgreSQL atual.
+
+Como funciona?
+- Cada passo roda uma vez, em um processo próprio, com o próprio código do
+  Migrador: as tabelas são lidas uma única vez, em ordem de chave, e todos
+  os processos importam o mesmo snapshot do PostgreSQL
+- A cada TAMANHO_CONSULTA documentos a faixa de chaves lida é conferida no
+  MongoDB (busca pelo índice de _id), comparando o hash canônico de cada
+  documento com o gravado
+- Os resumos gerados com $out são recalculados a partir das coleções
+  conferidas e comparados com os gravados
+- Só as faixas com diferença são mostradas, junto com as referências
+  que apontam para documentos inexistentes
+
+Sai com código 1 se encontrar qualquer diferença.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from datetime import datetime
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+from migrar import (COLECAO_BALDES, COLECAO_EVENTOS, LAYOUT_TICKETS, PASSOS, RESUMOS, Migrador,
+                    colecoes_do_passo)
+
+# === CONFIGURAÇÃO DA VERIFICAÇÃO ===
+# Processos verificando passos ao mesmo tempo (no máximo um por passo)
+PROCESSOS = int(os.getenv('MIGRAR_VERIFICAR_PROCESSOS', str(os.cpu_count() or 4)))
+# Documentos por faixa conferida (e _id buscados por consulta no MongoDB)
+TAMANHO_CONSULTA = int(os.getenv('MIGRAR_VERIFICAR_FAIXA', '10000'))
+# Faixas já montadas esperando a conferência no MongoDB, por processo
+FAIXAS_EM_ESPERA = 2
+# Quantos _id de exemplo mostrar por faixa com diferença
+EXEMPLOS = 5
+
+# Campos que referenciam outras coleções: coleção -> [(caminho, coleção referenciada)]
+REFERENCIAS = {
+    'rotas': [('origem', 'paradas'), ('destino', 'paradas'), ('empresas', 'empresas')],
+    'horarios': [
+        ('rota', 'rotas'),
+        ('funcionarios', 'funcionarios'),
+        ('assentos.tickets.passageiro', 'passageiros'),
+        ('tickets.passageiro', 'passageiros'),
+        ('veiculo', 'veiculos'),
+    ],
+    COLECAO_BALDES: [('horario', 'horarios'), ('tickets.passageiro', 'passageiros')],
+    COLECAO_EVENTOS: [
+        ('horario', 'horarios'),
+        ('passageiro', 'passageiros'),
+        ('meta.rota', 'rotas'),
+        ('meta.empresas', 'empresas'),
+    ],
+}
+
+
+def canonico(valor):
+    """
+    Converte um valor para uma forma que não muda na ida e volta ao MongoDB.
+
+    Datas perdem os microssegundos (o BSON guarda milissegundos) e decimais,
+    ObjectIds, floats e binários viram texto.
+    """
+    if isinstance(valor, dict):
+        return {chave: canonico(item) for chave, item in valor.items()}
+    if isinstance(valor, list):
+        return [canonico(item) for item in valor]
+    if isinstance(valor, datetime):
+        return valor.replace(microsecond=valor.microsecond // 1000 * 1000, tzinfo=None).isoformat()
+    if isinstance(valor, Decimal128):
+        return str(valor.to_decimal())
+    if isinstance(valor, (ObjectId, Decimal)):
+        return str(valor)
+    if isinstance(valor, float):
+        return repr(valor)
+    if isinstance(valor, bytes):
+        return valor.hex()
+    return valor
+
+
+def resumo_documento(documento):
+    """Hash do conteúdo canônico de um documento"""
+    texto = json.dumps(canonico(documento), sort_keys=True, ensure_ascii=False)
+    return hashlib.md5(texto.encode()).digest()
+
+
+def chave_id(id_mongo):
+    """_id como chave de dicionário (os resumos por rota/dia têm _id composto)"""
+    if isinstance(id_mongo, dict):
+        return json.dumps(canonico(id_mongo), sort_keys=True)
+    return id_mongo
+
+
+def valores(documento, caminho):
+    """
+    Valores de um caminho com pontos, descendo por listas (como o MongoDB).
+
+    Campos ausentes não geram valores (o caminho não existe nesse layout);
+    campos com null geram None.
+    """
+    atuais = [documento]
+    for campo in caminho.split('.'):
+        proximos = []
+        for atual in atuais:
+            if not isinstance(atual, dict) or campo not in atual:
+                continue
+            valor = atual.get(campo)
+            proximos.extend(valor if isinstance(valor, list) else [valor])
+        atuais = proximos
+    return atuais
+
+
+def fatias(itens, tamanho):
+    for inicio in range(0, len(itens), tamanho):
+        yield itens[inicio:inicio + tamanho]
+
+
+class Coletor:
+    """
+    Recebe os documentos que a migração gravaria, no lugar do GravadorEmLotes,
+    e guarda só o _id e o hash de cada um (e os horários, para buscar os eventos).
+
+    O coletor principal de cada passo (ou de cada resumo) fecha uma faixa a
+    cada TAMANHO_CONSULTA documentos e a envia para conferência junto com as
+    dos `dependentes` (baldes, eventos e resumos dos mesmos horários, que
+    chegam antes do horário a que pertencem).
+    """
+
+    def __init__(self, verificador, nome, principal=True, dependentes=()):
+        self.verificador = verificador
+        self.nome = nome
+        self.principal = principal
+        self.dependentes = dependentes
+        self.esperados = {}
+        self.horarios = set()
+        self.primeira_chave = None
+        self.ultima_chave = None
+        self.total = 0
+        self.lotes = 0
+        # Preenchidos pela conferência
+        self.encontrados = 0
+        self.faixas = []  # faixas com diferença: (rótulo, diferentes, ausentes, exemplos)
+        self.referencias_pendentes = 0
+
+    def adicionar(self, documento, chave=None):
+        self.esperados[chave_id(documento["_id"])] = (documento["_id"], resumo_documento(documento))
+        if "horario" in documento:
+            self.horarios.add(documento["horario"])
+        self.total += 1
+        if self.principal:
+            if self.primeira_chave is None:
+                self.primeira_chave = chave
+            self.ultima_chave = chave
+            if len(self.esperados) >= TAMANHO_CONSULTA:
+                self.fechar_faixa()
+
+    def fechar_faixa(self):
+        """Envia a faixa atual (e a dos dependentes) para conferência"""
+        self.lotes += 1
+        if self.primeira_chave is not None:
+            rotulo = f"chaves {self.primeira_chave} a {self.ultima_chave}"
+        else:
+            rotulo = f"lote {self.lotes}"
+        for coletor in (*self.dependentes, self):
+            if coletor.esperados:
+                esperados, coletor.esperados = coletor.esperados, {}
+                horarios, coletor.horarios = coletor.horarios, set()
+                self.verificador.agendar(coletor, rotulo, esperados, horarios)
+        self.primeira_chave = None
+
+    def sincronizar(self):
+        pass
+
+    def finalizar(self):
+        if self.principal:
+            self.fechar_faixa()
+
+    def resultado(self):
+        return {
+            "esperados": self.total,
+            "encontrados": self.encontrados,
+            "faixas": self.faixas,
+            "referencias_pendentes": self.referencias_pendentes,
+        }
+
+
+class Verificador(Migrador):
+    """Migrador que monta os documentos esperados e compara com o MongoDB"""
+
+    def __init__(self, relatar=False):
+        super().__init__()
+        self.relatar = relatar
+        self.sufixo = ''  # confere sempre as coleções publicadas
+        self.coletores = {}
+        # A conferência no MongoDB de uma faixa roda enquanto a próxima é
+        # lida do PostgreSQL (uma thread, então os coletores não disputam)
+        self.conferencia = ThreadPoolExecutor(max_workers=1)
+        self.conferencias = deque()
+
+    def mostrar(self, mensagem, tipo="INFO"):
+        # Nos processos de verificação as mensagens da migração só atrapalham
+        if self.relatar:
+            super().mostrar(mensagem, tipo)
+
+    def gravador(self, nome, dependentes=()):
+        self.coletores[nome] = Coletor(self, nome, principal=nome in PASSOS, dependentes=dependentes)
+        return self.coletores[nome]
+
+    def remover_baldes_obsoletos(self, filtros):
+        # A verificação nunca altera o MongoDB
+        pass
+
+    def remover_eventos(self, horarios):
+        pass
+
+    def criar_colecao_eventos(self):
+        pass
+
+    def agendar(self, coletor, rotulo, esperados, horarios):
+        """Confere uma faixa na thread de conferência, com no máximo FAIXAS_EM_ESPERA na fila"""
+        while len(self.conferencias) >= FAIXAS_EM_ESPERA:
+            self.conferencias.popleft().result()
+        self.conferencias.append(
+            self.conferencia.submit(self.conferir_faixa, coletor, rotulo, esperados, horarios)
+        )
+
+    def aguardar_conferencias(self):
+        while self.conferencias:
+            self.conferencias.popleft().result()
+
+    def referencias_pendentes(self, referencias):
+        """Conta as referências que não apontam para nenhum documento"""
+        pendentes = 0
+        for destino, ids in referencias.items():
+            ids = list(ids)
+            for parte in fatias(ids, TAMANHO_CONSULTA):
+                existentes = self.colecao(destino).count_documents({"_id": {"$in": parte}})
+                pendentes += len(parte) - existentes
+        return pendentes
+
+    def conferir_faixa(self, coletor, rotulo, esperados, horarios):
+        """
+        Compara os documentos esperados de uma faixa com os do MongoDB.
+
+        Anota no coletor quantos foram encontrados, os _id diferentes ou
+        ausentes (se houver) e as referências pendentes dos documentos gravados.
+        """
+        if coletor.nome == COLECAO_EVENTOS:
+            # A coleção time-series não tem índice em _id: os eventos são
+            # buscados pelos horários da faixa (índice de horario), e um
+            # evento desses horários que não era esperado também difere
+            filtro = {"horario": {"$in": list(horarios)}}
+        else:
+            filtro = {"_id": {"$in": [id_mongo for id_mongo, _ in esperados.values()]}}
+
+        diferentes = []
+        encontrados = set()
+        nulas = 0
+        referencias = {}
+        for documento in self.colecao(coletor.nome).find(filtro):
+            chave = chave_id(documento["_id"])
+            encontrados.add(chave)
+            if chave not in esperados or resumo_documento(documento) != esperados[chave][1]:
+                diferentes.append(str(documento["_id"]))
+            for caminho, destino in REFERENCIAS.get(coletor.nome, []):
+                for referencia in valores(documento, caminho):
+                    if referencia is None:
+                        nulas += 1
+                    else:
+                        referencias.setdefault(destino, set()).add(referencia)
+
+        ausentes = [str(id_mongo) for chave, (id_mongo, _) in esperados.items() if chave not in encontrados]
+        coletor.encontrados += len(encontrados)
+        coletor.referencias_pendentes += nulas + self.referencias_pendentes(referencias)
+        if diferentes or ausentes:
+            coletor.faixas.append((rotulo, len(diferentes), len(ausentes), (diferentes + ausentes)[:EXEMPLOS]))
+
+    def verificar_passo(self, passo):
+        """
+        Monta todos os documentos de um passo, numa única leitura do
+        PostgreSQL, e confere cada faixa no MongoDB; devolve o resultado
+        de cada coleção do passo.
+        """
+        self.coletores = {}
+        getattr(self, f"migrar_{passo}")()
+        self.aguardar_conferencias()
+        return {nome: coletor.resultado() for nome, coletor in self.coletores.items()}
+
+    def verificar_resumos(self):
+        """
+        Recalcula os resumos gerados com $out a partir das coleções gravadas
+        (conferidas pelos passos) e compara com os resumos no MongoDB.
+        """
+        resultados = {}
+        for origem, pipeline, destino in self.agregacoes_resumos():
+            coletor = Coletor(self, destino)
+            for documento in self.colecao(origem).aggregate(pipeline, allowDiskUse=True):
+                coletor.adicionar(documento)
+            coletor.finalizar()
+            self.aguardar_conferencias()
+            resultados[destino] = coletor.resultado()
+        return resultados
+
+    def fechar(self):
+        self.conferencia.shutdown()
+        super().fechar()
+
+
+# Cada processo mantém um Verificador (conexões) para todos os seus passos
+_verificador = None
+
+
+def iniciar_processo(snapshot):
+    global _verificador
+    _verificador = Verificador()
+    # Todos os processos leem o mesmo snapshot, exportado pelo principal
+    _verificador.importar_snapshot(snapshot)
+
+
+def verificar_passo(passo):
+    return _verificador.verificar_passo(passo)
+
+
+def main():
+    inicio = time.perf_counter()
+    verificador = Verificador(relatar=True)
+    print("\n" + "="*60)
+    print("🔎 VERIFICAÇÃO: PostgreSQL ↔ MongoDB")
+    print("="*60)
+    processos = max(1, min(PROCESSOS, len(PASSOS)))
+    verificador.mostrar(f"{len(PASSOS)} passos em {processos} processos, faixas de {TAMANHO_CONSULTA} documentos")
+
+    # O snapshot exportado vale enquanto a transação do principal estiver aberta
+    snapshot = verificador.exportar_snapshot()
+    resultados = {}
+    with ProcessPoolExecutor(max_workers=processos, initializer=iniciar_processo,
+                             initargs=(snapshot,)) as executor:
+        futuros = [executor.submit(verificar_passo, passo) for passo in PASSOS]
+        for futuro in as_completed(futuros):
+            resultados.update(futuro.result())
+    # Os resumos dependem só do MongoDB já conferido pelos passos
+    if RESUMOS:
+        resultados.update(verificador.verificar_resumos())
+
+    ok = True
+    print()
+    for nome in verificador.colecoes_publicadas():
+        resultado = resultados.get(nome, {"esperados": 0, "encontrados": 0, "faixas": [],
+                                          "referencias_pendentes": 0})
+        gravados = verificador.colecao(nome).count_documents({})
+        # Documentos no MongoDB que nenhuma faixa encontrou não deveriam existir
+        extras = gravados - resultado["encontrados"]
+        pendentes = resultado["referencias_pendentes"]
+        if not resultado["faixas"] and extras <= 0 and not pendentes:
+            verificador.mostrar(f"✓ {nome}: {resultado['esperados']} documentos conferidos", "OK")
+            continue
+
+        ok = False
+        verificador.mostrar(f"✗ {nome}: {resultado['esperados']} esperados, {gravados} no MongoDB", "ERRO")
+        for rotulo, diferentes, ausentes, exemplos in resultado["faixas"]:
+            print(f"    {rotulo}: {diferentes} diferentes, {ausentes} ausentes (ex.: {', '.join(exemplos)})")
+        if extras > 0:
+            print(f"    {extras} documentos a mais no MongoDB")
+        if pendentes:
+            print(f"    {pendentes} referências pendentes")
+
+    if LAYOUT_TICKETS != 'baldes' and COLECAO_BALDES in verificador.mongo_db.list_collection_names():
+        verificador.mostrar(f"{COLECAO_BALDES} existe, mas MIGRAR_LAYOUT_TICKETS não é 'baldes'", "AVISO")
+
+    verificador.fechar()
+    print(f"\n⏱️  Tempo: {time.perf_counter() - inicio:.2f} segundos")
+    print("="*60)
+    print("✅ MongoDB confere com o PostgreSQL!\n" if ok else "❌ Diferenças encontradas\n")
+    return 0 if ok else 1
+
+
+# === PONTO DE INÍCIO ===
+if __name__ == "__main__":
+    sys.exit(main())
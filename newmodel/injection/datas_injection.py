@@ -5,12 +5,30 @@ Script de injeção de dados para o sistema de transporte rodoviário
 Gera dados realistas para todas as tabelas do sistema
 """
 
+import argparse
+import hashlib
 import psycopg2
 from psycopg2 import sql
+from psycopg2.extras import execute_values
 from faker import Faker
+from faker.providers.internet.pt_BR import Provider as InternetProvider
+from faker.providers.person.pt_BR import Provider as PersonProvider
+import io
+import operator
 import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, date, timedelta, time
+from decimal import Decimal, ROUND_HALF_UP
+import os
 import re
+import unicodedata
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Só é necessário para --format parquet
+    pyarrow = None
 
 # Configuração da conexão com PostgreSQL
 DB_CONFIG = {
@@ -21,61 +39,372 @@ DB_CONFIG = {
     'port': 5432
 }
 
+# Modo de carga:
+#   'copy'   - gera as linhas em lotes e carrega com COPY FROM STDIN (mais rápido)
+#   'values' - gera as linhas em lotes e carrega com INSERT de várias linhas (execute_values)
+#   'row'    - um INSERT por linha
+LOAD_MODE = 'copy'
+BATCH_SIZE = 10000  # Linhas por lote nos modos 'copy' e 'values'
+ID_BLOCK = 10000  # IDs reservados de uma vez em cada sequência
+PARTITION_DAYS = 7  # Dias de viagens por partição (com as empresas, limita quantos processos trabalham)
+LIST_LIMIT = 20  # Acima disso, empresas, rotas e veículos não são listados um a um
+
+# Tamanhos na escala 1 (multiplicados por --scale; veja parse_args)
+BASE_SIZES = {
+    'companies': 5,
+    'stops': 30,
+    'routes': 10,
+    'vehicles': 15,
+    'passengers': 50,
+    'employees': 20,
+}
+
 # Inicializar Faker com locale pt_BR
 fake = Faker('pt_BR')
 Faker.seed(42)  # Para resultados reproduzíveis
 random.seed(42)
 
-def get_connection():
+def get_connection(config=DB_CONFIG):
     """Estabelece conexão com o banco de dados"""
     try:
-        conn = psycopg2.connect(**DB_CONFIG)
+        conn = psycopg2.connect(**config)
         return conn
     except Exception as e:
         print(f"Erro ao conectar ao banco de dados: {e}")
         return None
 
-def generate_cnpj():
-    """Gera um CNPJ válido no formato brasileiro"""
-    # Gera números aleatórios
-    cnpj = [random.randint(0, 9) for _ in range(12)]
-    
+# Pesos dos dígitos verificadores: o primeiro usa os pesos sem o primeiro item
+CNPJ_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+CPF_WEIGHTS = (11, 10, 9, 8, 7, 6, 5, 4, 3, 2)
+
+def cnpj_check_digits(cnpj):
+    """Acrescenta os dois dígitos verificadores a 12 dígitos de CNPJ"""
     # Calcula primeiro dígito verificador
-    soma = sum(cnpj[i] * (5 - i if i < 4 else 13 - i) for i in range(12))
+    soma = sum(map(operator.mul, cnpj, CNPJ_WEIGHTS[1:]))
     digito1 = 11 - (soma % 11) if soma % 11 >= 2 else 0
-    cnpj.append(digito1)
+    cnpj = cnpj + [digito1]
     
     # Calcula segundo dígito verificador
-    soma = sum(cnpj[i] * (6 - i if i < 5 else 14 - i) for i in range(13))
+    soma = sum(map(operator.mul, cnpj, CNPJ_WEIGHTS))
     digito2 = 11 - (soma % 11) if soma % 11 >= 2 else 0
-    cnpj.append(digito2)
-    
-    # Formata: 00.000.000/0000-00
+    return cnpj + [digito2]
+
+def format_cnpj(cnpj):
+    """Formata: 00.000.000/0000-00"""
     return f"{cnpj[0]}{cnpj[1]}.{cnpj[2]}{cnpj[3]}{cnpj[4]}.{cnpj[5]}{cnpj[6]}{cnpj[7]}/{cnpj[8]}{cnpj[9]}{cnpj[10]}{cnpj[11]}-{cnpj[12]}{cnpj[13]}"
 
-def generate_cpf():
-    """Gera um CPF válido no formato brasileiro"""
-    # Gera 9 primeiros dígitos
-    cpf = [random.randint(0, 9) for _ in range(9)]
-    
+def generate_cnpj():
+    """Gera um CNPJ válido no formato brasileiro"""
+    # Gera números aleatórios
+    return format_cnpj(cnpj_check_digits([random.randint(0, 9) for _ in range(12)]))
+
+def cpf_check_digits(cpf):
+    """Acrescenta os dois dígitos verificadores a 9 dígitos de CPF"""
     # Calcula primeiro dígito verificador
-    soma = sum(cpf[i] * (10 - i) for i in range(9))
+    soma = sum(map(operator.mul, cpf, CPF_WEIGHTS[1:]))
     digito1 = 11 - (soma % 11) if soma % 11 >= 2 else 0
-    cpf.append(digito1)
+    cpf = cpf + [digito1]
     
     # Calcula segundo dígito verificador
-    soma = sum(cpf[i] * (11 - i) for i in range(10))
+    soma = sum(map(operator.mul, cpf, CPF_WEIGHTS))
     digito2 = 11 - (soma % 11) if soma % 11 >= 2 else 0
-    cpf.append(digito2)
-    
-    # Formata: 000.000.000-00
+    return cpf + [digito2]
+
+def format_cpf(cpf):
+    """Formata: 000.000.000-00"""
     return f"{cpf[0]}{cpf[1]}{cpf[2]}.{cpf[3]}{cpf[4]}{cpf[5]}.{cpf[6]}{cpf[7]}{cpf[8]}-{cpf[9]}{cpf[10]}"
 
+def generate_cpf():
+    """Gera um CPF válido no formato brasileiro"""
+    # Gera 9 primeiros dígitos
+    return format_cpf(cpf_check_digits([random.randint(0, 9) for _ in range(9)]))
+
+def unique_bases(seen, count, digits):
+    """
+    Sorteia `count` números de `digits` dígitos, distintos entre si e dos
+    que já estão em `seen` (que passa a incluí-los).
+    """
+    bases = random.sample(range(10 ** digits), count)
+    for index, base in enumerate(bases):
+        while base in seen:
+            base = random.randrange(10 ** digits)
+        seen.add(base)
+        bases[index] = base
+    return bases
+
+def generate_cpfs(seen, count):
+    """
+    Gera `count` CPFs válidos e distintos de uma vez.
+
+    Cada CPF vem de uma base de 9 dígitos diferente (veja unique_bases) e
+    os dígitos verificadores dependem só da base, então nunca se repetem.
+    """
+    cpfs = []
+    for base in unique_bases(seen, count, 9):
+        text = f"{base:09d}"
+        digits = cpf_check_digits(list(map(int, text)))
+        cpfs.append(f"{text[:3]}.{text[3:6]}.{text[6:]}-{digits[9]}{digits[10]}")
+    return cpfs
+
+def generate_cnpjs(seen, count):
+    """Gera `count` CNPJs válidos e distintos de uma vez (como generate_cpfs)"""
+    return [format_cnpj(cnpj_check_digits(list(map(int, f"{base:012d}"))))
+            for base in unique_bases(seen, count, 12)]
+
+def ascii_name(name):
+    """Nome sem acentos e espaços, em minúsculas, para emails"""
+    return unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower().replace(' ', '')
+
+class PersonSynthesizer:
+    """
+    Gera os dados pessoais em lotes, sem chamar o Faker por pessoa.
+
+    Os nomes saem das listas pt_BR do Faker, carregadas uma vez. CPFs são
+    distintos entre todas as pessoas geradas pelo mesmo objeto e o email
+    leva o ID da pessoa, então nenhum dos dois viola o UNIQUE de person.
+    """
+
+    AREA_CODES = (11, 21, 31, 41, 47, 51, 61, 62, 71, 81, 85, 91)
+
+    def __init__(self):
+        self.first_names = PersonProvider.first_names
+        self.last_names = PersonProvider.last_names
+        self.domains = InternetProvider.free_email_domains
+        # Parte do email de cada nome, calculada uma vez
+        self.email_names = {name: ascii_name(name) for name in self.first_names + self.last_names}
+        self.cpf_bases = set()
+
+    def people(self, person_ids, min_age, max_age):
+        """
+        Devolve (first_name, last_name, cpf, email, phone, birthday) para
+        cada ID, com idade entre min_age e max_age anos.
+        """
+        count = len(person_ids)
+        draw = random.random
+        first_names = random.choices(self.first_names, k=count)
+        last_names = random.choices(self.last_names, k=count)
+        cpfs = generate_cpfs(self.cpf_bases, count)
+        # Celulares: (DDD) 9XXXX-XXXX
+        area_codes = random.choices(self.AREA_CODES, k=count)
+        numbers = [int(draw() * 10 ** 8) for _ in range(count)]
+        # Nascimento: hoje menos uma idade sorteada em dias
+        today = date.today()
+        youngest = int(min_age * 365.25)
+        span = int((max_age + 1) * 365.25) - youngest
+        ages = [youngest + int(draw() * span) for _ in range(count)]
+        
+        people = []
+        for person_id, first_name, last_name, cpf, area_code, number, age in zip(
+                person_ids, first_names, last_names, cpfs, area_codes, numbers, ages):
+            email = (f"{self.email_names[first_name]}.{self.email_names[last_name]}{person_id}"
+                     f"@{self.domains[person_id % len(self.domains)]}")
+            phone = f"({area_code}) 9{number // 10000:04d}-{number % 10000:04d}"
+            people.append((first_name, last_name, cpf, email, phone, today - timedelta(days=age)))
+        return people
+
+def draw_unique(seen, draw):
+    """Sorteia com `draw` até obter um valor ainda não usado e o registra em `seen`"""
+    value = draw()
+    while value in seen:
+        value = draw()
+    seen.add(value)
+    return value
+
+CSV_SPECIAL = re.compile('[,"\n\r]')
+
+def csv_value(value):
+    """Formata um valor para CSV como o COPY lê: vazio sem aspas é NULL"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = str(value)
+    if not text or CSV_SPECIAL.search(text):
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+def copy_value(value):
+    """Formata um valor para o formato texto do COPY"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+class DatasetDirectory:
+    """
+    Usado no lugar da conexão para gerar os dados em arquivos (--output).
+
+    Cada lote de uma tabela vira um arquivo em <path>/<tabela>/, com nome
+    começando por `prefix` (uma partição por prefixo). As sequências ficam
+    aqui, começando em 1, porque o conjunto é carregado num banco vazio
+    (veja load_dataset.py).
+    """
+
+    def __init__(self, path, file_format='csv', prefix='main'):
+        self.path = path
+        self.format = file_format
+        self.prefix = prefix
+        self.sequences = {}
+        self.chunks = {}
+
+    def reserve(self, table, count):
+        """Reserva `count` IDs consecutivos da tabela e devolve o primeiro"""
+        start = self.sequences.get(table, 0) + 1
+        self.sequences[table] = start + count - 1
+        return start
+
+    def write(self, table, columns, rows):
+        """Grava um lote de linhas num novo arquivo da tabela"""
+        directory = os.path.join(self.path, table)
+        os.makedirs(directory, exist_ok=True)
+        chunk = self.chunks.get((self.prefix, table), 0)
+        self.chunks[(self.prefix, table)] = chunk + 1
+        name = os.path.join(directory, f"{self.prefix}-{chunk:05d}.{self.format}")
+        
+        if self.format == 'parquet':
+            data = {column: [row[index] for row in rows] for index, column in enumerate(columns)}
+            pyarrow.parquet.write_table(pyarrow.table(data), name)
+        else:
+            with open(name, 'w', encoding='utf-8', newline='') as output:
+                output.write(','.join(columns) + '\n')
+                for row in rows:
+                    output.write(','.join(map(csv_value, row)))
+                    output.write('\n')
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+class IdAllocator:
+    """
+    Entrega IDs de uma coluna SERIAL reservando-os na sequência em blocos.
+
+    Cada reserva pega ID_BLOCK valores consecutivos movendo a sequência
+    uma vez (veja reserve_range), então as linhas já são geradas com a chave
+    primária, sem RETURNING por linha.
+    """
+
+    def __init__(self, conn, table, column, block=ID_BLOCK):
+        self.conn = conn
+        self.table = table
+        self.column = column
+        self.block = block
+        self.reserved = deque()
+
+    def next(self):
+        if not self.reserved:
+            start = reserve_range(self.conn, self.table, self.column, self.block)
+            self.reserved.extend(range(start, start + self.block))
+        return self.reserved.popleft()
+
+class IdRange:
+    """IDs consecutivos a partir de um início já reservado (veja reserve_range)"""
+
+    def __init__(self, start):
+        self.current = start
+
+    def next(self):
+        value = self.current
+        self.current += 1
+        return value
+
+def reserve_range(conn, table, column, count):
+    """
+    Reserva `count` IDs consecutivos na sequência de uma coluna SERIAL e devolve o primeiro.
+
+    O nextval e o setval não são atômicos juntos: um advisory lock da sessão
+    (chave = OID da sequência) impede que outra reserva ande a sequência entre
+    os dois. O lock é liberado logo depois, sem esperar o commit da carga.
+    """
+    if isinstance(conn, DatasetDirectory):
+        return conn.reserve(table, count)
+    cursor = conn.cursor()
+    cursor.execute("SELECT pg_get_serial_sequence(%s, %s)::regclass::oid::bigint", (table, column))
+    lock = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_advisory_lock(%s)", (lock,))
+    try:
+        cursor.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, %s), nextval(pg_get_serial_sequence(%s, %s)) + %s - 1)",
+            (table, column, table, column, count)
+        )
+        last = cursor.fetchone()[0]
+    finally:
+        cursor.execute("SELECT pg_advisory_unlock(%s)", (lock,))
+        cursor.close()
+    return last - count + 1
+
+class TableLoader:
+    """
+    Acumula as linhas de uma tabela e grava em lotes conforme LOAD_MODE,
+    ou em arquivos se `conn` for um DatasetDirectory.
+
+    Tabelas com chave estrangeira recebem em `parents` os loaders das
+    tabelas referenciadas, que são descarregados antes de cada lote.
+    """
+
+    def __init__(self, conn, table, columns, parents=()):
+        self.directory = conn if isinstance(conn, DatasetDirectory) else None
+        self.cursor = None if self.directory else conn.cursor()
+        self.table = table
+        self.columns = columns
+        self.parents = parents
+        self.rows = []
+        self.total = 0
+        self.batch_size = 1 if LOAD_MODE == 'row' and not self.directory else BATCH_SIZE
+
+    def add(self, row):
+        """Adiciona uma linha (tupla na ordem de `columns`)"""
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Grava as linhas acumuladas"""
+        if not self.rows:
+            return
+        for parent in self.parents:
+            parent.flush()
+        
+        columns = ', '.join(self.columns)
+        if self.directory:
+            self.directory.write(self.table, self.columns, self.rows)
+        elif LOAD_MODE == 'copy':
+            buffer = io.StringIO()
+            for row in self.rows:
+                buffer.write('\t'.join(map(copy_value, row)))
+                buffer.write('\n')
+            buffer.seek(0)
+            self.cursor.copy_expert(f"COPY {self.table} ({columns}) FROM STDIN", buffer)
+        elif LOAD_MODE == 'values':
+            execute_values(self.cursor, f"INSERT INTO {self.table} ({columns}) VALUES %s",
+                           self.rows, page_size=len(self.rows))
+        else:
+            placeholders = ', '.join(['%s'] * len(self.columns))
+            for row in self.rows:
+                self.cursor.execute(f"INSERT INTO {self.table} ({columns}) VALUES ({placeholders})", row)
+        
+        self.total += len(self.rows)
+        self.rows = []
+
+    def close(self):
+        self.flush()
+        if self.cursor:
+            self.cursor.close()
+
 def insert_companies(conn, num=5):
     """Insere empresas de transporte"""
     print("Inserindo empresas...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'company', 'id_company')
+    loader = TableLoader(conn, 'company', ('id_company', 'name', 'cnpj', 'email', 'phone', 'is_active'))
     companies = []
+    cnpjs = generate_cnpjs(set(), num)
     
     company_names = [
         "Viação Cometa", "Expresso Brasileiro", "Águia Branca",
@@ -85,28 +414,27 @@ def insert_companies(conn, num=5):
     
     for i in range(num):
         name = company_names[i] if i < len(company_names) else f"Viação {fake.company()}"
-        cnpj = generate_cnpj()
+        cnpj = cnpjs[i]
         email = f"contato@{name.lower().replace(' ', '').replace('ção', 'cao')}.com.br"
         phone = fake.phone_number()
         
-        cursor.execute("""
-            INSERT INTO company (name, cnpj, email, phone, is_active)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id_company
-        """, (name, cnpj, email, phone, True))
-        
-        company_id = cursor.fetchone()[0]
+        company_id = ids.next()
+        loader.add((company_id, name, cnpj, email, phone, True))
         companies.append(company_id)
-        print(f"  ✓ {name}")
+        if num <= LIST_LIMIT:
+            print(f"  ✓ {name}")
     
+    loader.close()
     conn.commit()
-    cursor.close()
+    if num > LIST_LIMIT:
+        print(f"  ✓ {num} empresas inseridas")
     return companies
 
 def insert_bus_stops(conn, num=30):
     """Insere paradas de ônibus"""
     print("Inserindo paradas de ônibus...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'bus_stop', 'id_stop')
+    loader = TableLoader(conn, 'bus_stop', ('id_stop', 'name', 'street', 'number', 'city', 'is_active'))
     stops = []
     
     cities = ["Campinas", "São Paulo", "Rio de Janeiro", "Belo Horizonte", 
@@ -121,24 +449,21 @@ def insert_bus_stops(conn, num=30):
         street = fake.street_name()
         number = str(random.randint(1, 9999))
         
-        cursor.execute("""
-            INSERT INTO bus_stop (name, street, number, city, is_active)
-            VALUES (%s, %s, %s, %s, %s)
-            RETURNING id_stop
-        """, (name, street, number, city, True))
-        
-        stop_id = cursor.fetchone()[0]
+        stop_id = ids.next()
+        loader.add((stop_id, name, street, number, city, True))
         stops.append({'id': stop_id, 'city': city, 'name': name})
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {num} paradas inseridas")
     return stops
 
 def insert_routes(conn, company_ids, num=10):
     """Insere rotas de transporte"""
     print("Inserindo rotas...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'route', 'id_route')
+    loader = TableLoader(conn, 'route', ('id_route', 'id_company', 'route_code', 'name', 'description',
+                                         'total_distance', 'route_type', 'is_active'))
     routes = []
     
     route_types = ['urban', 'interurban', 'express']
@@ -151,28 +476,32 @@ def insert_routes(conn, company_ids, num=10):
         distance = round(random.uniform(5.0, 500.0), 2)
         route_type = random.choice(route_types)
         
-        cursor.execute("""
-            INSERT INTO route (id_company, route_code, name, description, 
-                             total_distance, route_type, is_active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id_route
-        """, (company_id, route_code, name, description, distance, route_type, True))
-        
-        route_id = cursor.fetchone()[0]
+        route_id = ids.next()
+        loader.add((route_id, company_id, route_code, name, description, distance, route_type, True))
         routes.append({'id': route_id, 'type': route_type, 'company_id': company_id})
-        print(f"  ✓ {name}")
+        if num <= LIST_LIMIT:
+            print(f"  ✓ {name}")
     
+    loader.close()
     conn.commit()
-    cursor.close()
+    if num > LIST_LIMIT:
+        print(f"  ✓ {num} rotas inseridas")
     return routes
 
 def insert_route_stops(conn, routes, stops):
-    """Insere paradas nas rotas"""
+    """
+    Insere paradas nas rotas.
+
+    Devolve {id_route: [{'stop_id', 'order', 'fare'}]} em ordem de parada,
+    para os tickets serem gerados sem consultar o banco.
+    """
     print("Inserindo paradas nas rotas...")
-    cursor = conn.cursor()
+    loader = TableLoader(conn, 'route_stop', ('id_route', 'id_stop', 'stop_order', 'distance_from_origin',
+                                              'estimated_min', 'fare_from_origin'))
+    route_stops_by_route = {}
     
     for route in routes:
-        # Cada rota tem entre 4 e 10 paradas
+        # Cada rota tem entre 4 e 10 paradas (distintas, então não há conflito de chave)
         num_stops = random.randint(4, 10)
         route_stops = random.sample(stops, min(num_stops, len(stops)))
         
@@ -187,22 +516,27 @@ def insert_route_stops(conn, routes, stops):
                 accumulated_time += random.randint(5, 30)
                 accumulated_fare += round(random.uniform(1.50, 5.00), 2)
             
-            cursor.execute("""
-                INSERT INTO route_stop (id_route, id_stop, stop_order, 
-                                       distance_from_origin, estimated_min, fare_from_origin)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT DO NOTHING
-            """, (route['id'], stop['id'], order, accumulated_distance, 
-                  accumulated_time, base_fare + accumulated_fare))
+            # Arredondada como o DECIMAL(8, 2) da coluna guardaria
+            fare = Decimal(str(base_fare + accumulated_fare)).quantize(Decimal('0.01'), ROUND_HALF_UP)
+            loader.add((route['id'], stop['id'], order, accumulated_distance,
+                        accumulated_time, fare))
+            route_stops_by_route.setdefault(route['id'], []).append({
+                'stop_id': stop['id'],
+                'order': order,
+                'fare': fare
+            })
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ Paradas vinculadas às rotas")
+    return route_stops_by_route
 
 def insert_schedules(conn, routes, num_per_route=3):
     """Insere horários para as rotas"""
     print("Inserindo horários...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'schedule', 'id_schedule')
+    loader = TableLoader(conn, 'schedule', ('id_schedule', 'id_route', 'id_company', 'departure_time',
+                                            'arrival_time', 'days_of_week', 'is_active'))
     schedules = []
     
     for route in routes:
@@ -221,32 +555,32 @@ def insert_schedules(conn, routes, num_per_route=3):
             else:  # 30% só dias úteis
                 days = [1, 2, 3, 4, 5]
             
-            cursor.execute("""
-                INSERT INTO schedule (id_route, id_company, departure_time, 
-                                     arrival_time, days_of_week, is_active)
-                VALUES (%s, %s, %s, %s, %s::jsonb, %s)
-                RETURNING id_schedule
-            """, (route['id'], route['company_id'], departure_time, 
-                  arrival_time, str(days), True))
-            
-            schedule_id = cursor.fetchone()[0]
+            schedule_id = ids.next()
+            loader.add((schedule_id, route['id'], route['company_id'], departure_time,
+                        arrival_time, str(days), True))
             schedules.append({
                 'id': schedule_id, 
                 'route_id': route['id'],
                 'route_type': route['type'],
-                'company_id': route['company_id']
+                'company_id': route['company_id'],
+                'departure_time': departure_time,
+                'arrival_time': arrival_time,
+                'days_of_week': days
             })
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {len(schedules)} horários inseridos")
     return schedules
 
 def insert_vehicles(conn, company_ids, num=15):
     """Insere veículos"""
     print("Inserindo veículos...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'vehicle', 'id_vehicle')
+    loader = TableLoader(conn, 'vehicle', ('id_vehicle', 'id_company', 'license_plate', 'brand', 'model', 'year',
+                                           'capacity', 'vehicle_type', 'has_assigned_seating', 'status'))
     vehicles = []
+    plates = set()
     
     brands = ["Mercedes-Benz", "Volvo", "Scania", "Marcopolo", "Comil"]
     models = ["O500", "B270F", "K310", "Paradiso", "Campione"]
@@ -255,9 +589,10 @@ def insert_vehicles(conn, company_ids, num=15):
     for _ in range(num):
         company_id = random.choice(company_ids)
         # Gera placa brasileira formato ABC-1234 ou ABC1D23
-        letters = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3))
-        numbers = ''.join(random.choices('0123456789', k=4))
-        license_plate = f"{letters}-{numbers}"
+        license_plate = draw_unique(plates, lambda: (
+            ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=3)) + '-'
+            + ''.join(random.choices('0123456789', k=4))
+        ))
         
         brand = random.choice(brands)
         model = random.choice(models)
@@ -275,31 +610,34 @@ def insert_vehicles(conn, company_ids, num=15):
             capacity = random.randint(42, 50)
             has_assigned_seating = True
         
-        cursor.execute("""
-            INSERT INTO vehicle (id_company, license_plate, brand, model, year, 
-                                capacity, vehicle_type, has_assigned_seating, status)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id_vehicle
-        """, (company_id, license_plate, brand, model, year, capacity, 
-              vehicle_type, has_assigned_seating, 'active'))
-        
-        vehicle_id = cursor.fetchone()[0]
+        vehicle_id = ids.next()
+        loader.add((vehicle_id, company_id, license_plate, brand, model, year, capacity,
+                    vehicle_type, has_assigned_seating, 'active'))
         vehicles.append({
             'id': vehicle_id,
             'capacity': capacity,
             'has_assigned_seating': has_assigned_seating,
             'company_id': company_id
         })
-        print(f"  ✓ {brand} {model} - {license_plate}")
+        if num <= LIST_LIMIT:
+            print(f"  ✓ {brand} {model} - {license_plate}")
     
+    loader.close()
     conn.commit()
-    cursor.close()
+    if num > LIST_LIMIT:
+        print(f"  ✓ {num} veículos inseridos")
     return vehicles
 
 def insert_seats(conn, vehicles):
-    """Insere assentos para veículos com assentos numerados"""
+    """
+    Insere assentos para veículos com assentos numerados.
+
+    Devolve {id_vehicle: [id_seat]} na ordem dos números dos assentos.
+    """
     print("Inserindo assentos...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'seat', 'id_seat')
+    loader = TableLoader(conn, 'seat', ('id_seat', 'id_vehicle', 'seat_number', 'floor', 'is_active'))
+    vehicle_seats = {}
     
     for vehicle in vehicles:
         if vehicle['has_assigned_seating']:
@@ -308,320 +646,338 @@ def insert_seats(conn, vehicles):
             for seat_num in range(1, capacity + 1):
                 floor = 1 if seat_num <= capacity // 2 else 2 if capacity > 45 else 1
                 
-                cursor.execute("""
-                    INSERT INTO seat (id_vehicle, seat_number, floor, is_active)
-                    VALUES (%s, %s, %s, %s)
-                """, (vehicle['id'], str(seat_num), floor, True))
+                seat_id = ids.next()
+                loader.add((seat_id, vehicle['id'], str(seat_num), floor, True))
+                vehicle_seats.setdefault(vehicle['id'], []).append(seat_id)
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ Assentos criados para veículos com numeração")
+    return vehicle_seats
 
 def insert_people(conn, num_passengers=50, num_employees=20):
     """Insere pessoas (passageiros e funcionários)"""
     print("Inserindo pessoas...")
-    cursor = conn.cursor()
+    ids = IdAllocator(conn, 'person', 'id_person')
+    people = TableLoader(conn, 'person', ('id_person', 'first_name', 'last_name', 'cpf', 'email', 'phone',
+                                          'birthday', 'person_type'))
+    passenger_loader = TableLoader(conn, 'passenger', ('id_person', 'loyalty_points', 'is_student'),
+                                   parents=[people])
+    synthesizer = PersonSynthesizer()
     passengers = []
     employees = []
     
-    # Passageiros
-    for _ in range(num_passengers):
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        cpf = generate_cpf()
-        email = fake.email()
-        phone = fake.phone_number()
-        birthday = fake.date_of_birth(minimum_age=18, maximum_age=80)
-        
-        cursor.execute("""
-            INSERT INTO person (first_name, last_name, cpf, email, phone, 
-                               birthday, person_type)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id_person
-        """, (first_name, last_name, cpf, email, phone, birthday, 'passenger'))
-        
-        person_id = cursor.fetchone()[0]
-        
-        # Inserir em Passenger
-        is_student = random.random() < 0.3  # 30% são estudantes
-        loyalty_points = random.randint(0, 1000)
-        
-        cursor.execute("""
-            INSERT INTO passenger (id_person, loyalty_points, is_student)
-            VALUES (%s, %s, %s)
-        """, (person_id, loyalty_points, is_student))
-        
-        passengers.append({'id': person_id, 'is_student': is_student})
+    # Passageiros, gerados em lotes
+    for start in range(0, num_passengers, BATCH_SIZE):
+        person_ids = [ids.next() for _ in range(min(BATCH_SIZE, num_passengers - start))]
+        for person_id, person in zip(person_ids, synthesizer.people(person_ids, 18, 80)):
+            people.add((person_id,) + person + ('passenger',))
+            
+            # Inserir em Passenger
+            is_student = random.random() < 0.3  # 30% são estudantes
+            loyalty_points = random.randint(0, 1000)
+            
+            passenger_loader.add((person_id, loyalty_points, is_student))
+            passengers.append({'id': person_id, 'is_student': is_student})
     
     # Funcionários
-    for _ in range(num_employees):
-        first_name = fake.first_name()
-        last_name = fake.last_name()
-        cpf = generate_cpf()
-        email = fake.email()
-        phone = fake.phone_number()
-        birthday = fake.date_of_birth(minimum_age=21, maximum_age=65)
-        
-        cursor.execute("""
-            INSERT INTO person (first_name, last_name, cpf, email, phone, 
-                               birthday, person_type)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id_person
-        """, (first_name, last_name, cpf, email, phone, birthday, 'employee'))
-        
-        person_id = cursor.fetchone()[0]
-        employees.append(person_id)
+    for start in range(0, num_employees, BATCH_SIZE):
+        person_ids = [ids.next() for _ in range(min(BATCH_SIZE, num_employees - start))]
+        for person_id, person in zip(person_ids, synthesizer.people(person_ids, 21, 65)):
+            people.add((person_id,) + person + ('employee',))
+            employees.append(person_id)
     
+    passenger_loader.close()
+    people.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {num_passengers} passageiros e {num_employees} funcionários")
     return passengers, employees
 
 def insert_students(conn, passengers):
     """Insere estudantes"""
     print("Inserindo estudantes...")
-    cursor = conn.cursor()
+    loader = TableLoader(conn, 'student', ('id_person', 'id_u', 'university_name', 'status'))
     
     universities = ["UNICAMP", "USP", "UFRJ", "UFMG", "UnB", "PUC", "UNESP"]
+    student_ids = set()
+    # Faixa dos RAs cresce com o número de passageiros para sempre haver RAs livres
+    max_ra = max(999999, 100000 + 10 * len(passengers))
     
     for passenger in passengers:
         if passenger['is_student']:
-            id_u = f"RA{random.randint(100000, 999999)}"
+            id_u = draw_unique(student_ids, lambda: f"RA{random.randint(100000, max_ra)}")
             university = random.choice(universities)
             status = random.choice(['active', 'active', 'active', 'inactive'])  # 75% ativos
             
-            cursor.execute("""
-                INSERT INTO student (id_person, id_u, university_name, status)
-                VALUES (%s, %s, %s, %s)
-            """, (passenger['id'], id_u, university, status))
+            loader.add((passenger['id'], id_u, university, status))
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ Estudantes cadastrados")
 
 def insert_employees_details(conn, employee_ids, company_ids):
     """Insere detalhes dos funcionários"""
     print("Inserindo detalhes de funcionários...")
-    cursor = conn.cursor()
+    loader = TableLoader(conn, 'employee', ('id_person', 'employee_code', 'id_company',
+                                            'hire_date', 'salary', 'employee_type', 'is_active'))
     drivers = []
     sellers = []
     
     employee_types = ['driver', 'seller', 'admin', 'mechanic']
+    codes = set()
+    # Faixa dos códigos cresce com o número de funcionários para sempre haver códigos livres
+    max_code = max(9999, 1000 + 10 * len(employee_ids))
     
     for emp_id in employee_ids:
-        employee_code = f"EMP{random.randint(1000, 9999)}"
+        employee_code = draw_unique(codes, lambda: f"EMP{random.randint(1000, max_code)}")
         company_id = random.choice(company_ids)
         hire_date = fake.date_between(start_date='-10y', end_date='today')
         salary = round(random.uniform(2000, 8000), 2)
         emp_type = random.choice(employee_types)
         
-        cursor.execute("""
-            INSERT INTO employee (id_person, employee_code, id_company, 
-                                 hire_date, salary, employee_type, is_active)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (emp_id, employee_code, company_id, hire_date, salary, emp_type, True))
+        loader.add((emp_id, employee_code, company_id, hire_date, salary, emp_type, True))
         
         if emp_type == 'driver':
             drivers.append(emp_id)
         elif emp_type == 'seller':
             sellers.append(emp_id)
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {len(employee_ids)} funcionários cadastrados")
     return drivers, sellers
 
 def insert_drivers(conn, driver_ids):
     """Insere motoristas"""
     print("Inserindo motoristas...")
-    cursor = conn.cursor()
+    loader = TableLoader(conn, 'driver', ('id_person', 'license_number', 'license_category',
+                                          'license_expiry_date'))
+    
+    licenses = set()
     
     for driver_id in driver_ids:
-        license_number = f"{random.randint(100000000, 999999999)}"
+        license_number = draw_unique(licenses, lambda: f"{random.randint(100000000, 999999999)}")
         license_category = random.choice(['D', 'E'])
         # Licença válida por 1-5 anos no futuro
         expiry_date = date.today() + timedelta(days=random.randint(365, 1825))
         
-        cursor.execute("""
-            INSERT INTO driver (id_person, license_number, license_category, 
-                               license_expiry_date)
-            VALUES (%s, %s, %s, %s)
-        """, (driver_id, license_number, license_category, expiry_date))
+        loader.add((driver_id, license_number, license_category, expiry_date))
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {len(driver_ids)} motoristas cadastrados")
 
 def insert_sellers(conn, seller_ids):
     """Insere vendedores"""
     print("Inserindo vendedores...")
-    cursor = conn.cursor()
+    loader = TableLoader(conn, 'seller', ('id_person', 'terminal_id'))
     
     for seller_id in seller_ids:
         terminal_id = random.randint(1, 10)
         
-        cursor.execute("""
-            INSERT INTO seller (id_person, terminal_id)
-            VALUES (%s, %s)
-        """, (seller_id, terminal_id))
+        loader.add((seller_id, terminal_id))
     
+    loader.close()
     conn.commit()
-    cursor.close()
     print(f"  ✓ {len(seller_ids)} vendedores cadastrados")
     return seller_ids
 
-def insert_trips(conn, schedules, vehicles, drivers, num_days=30):
-    """Insere viagens"""
-    print("Inserindo viagens...")
-    cursor = conn.cursor()
+def trip_calendar(num_days):
+    """
+    Datas de viagem, começando num_days // 2 dias antes de hoje, agrupadas
+    por dia da semana ISO (1=segunda, 7=domingo).
+    """
+    start_date = date.today() - timedelta(days=num_days // 2)
+    calendar = {weekday: [] for weekday in range(1, 8)}
+    for day_offset in range(num_days):
+        trip_date = start_date + timedelta(days=day_offset)
+        calendar[trip_date.isoweekday()].append(trip_date)
+    return calendar
+
+def calendar_chunks(calendar, days):
+    """
+    Divide um calendário de trip_calendar em trechos de `days` dias
+    consecutivos (o último pode ser menor), no mesmo formato.
+    """
+    all_dates = sorted(trip_date for dates in calendar.values() for trip_date in dates)
+    if not all_dates:
+        return []
+    chunks = [{weekday: [] for weekday in range(1, 8)}
+              for _ in range((all_dates[-1] - all_dates[0]).days // days + 1)]
+    for trip_date in all_dates:
+        chunks[(trip_date - all_dates[0]).days // days][trip_date.isoweekday()].append(trip_date)
+    return chunks
+
+def schedule_dates(calendar, days_of_week):
+    """Datas em que um horário opera, em ordem"""
+    return sorted(trip_date for weekday in set(days_of_week) for trip_date in calendar.get(weekday, []))
+
+def insert_trips(conn, schedules, vehicles, drivers, num_days=30, tickets_per_trip=None,
+                 ids=None, verbose=True, calendar=None, route_stops=None):
+    """
+    Insere viagens nos dias da semana de cada horário, começando
+    num_days // 2 dias antes de hoje (ou nas datas de `calendar`).
+
+    Com tickets_per_trip, cada viagem não cancelada vende exatamente esse
+    número de tickets (limitado à capacidade do veículo). Com `route_stops`
+    (de insert_route_stops), viagens de rotas com menos de 2 paradas não
+    vendem tickets, como em allocate_trip_tickets.
+    """
+    if verbose:
+        print("Inserindo viagens...")
+    ids = ids or IdAllocator(conn, 'trip', 'id_trip')
+    loader = TableLoader(conn, 'trip', ('id_trip', 'id_schedule', 'id_vehicle', 'id_driver', 'trip_date',
+                                        'departure_datetime', 'arrival_datetime', 'status', 'available_capacity'))
     trips = []
+    calendar = calendar or trip_calendar(num_days)
+    today = date.today()
     
-    start_date = date.today() - timedelta(days=15)
+    # Índices montados uma vez: veículos por empresa e datas por dias da semana
+    vehicles_by_company = {}
+    for vehicle in vehicles:
+        vehicles_by_company.setdefault(vehicle['company_id'], []).append(vehicle)
+    dates_by_days = {}
     
     for schedule in schedules:
-        # Cria viagens para os próximos dias
-        for day_offset in range(num_days):
-            trip_date = start_date + timedelta(days=day_offset)
-            
-            # Seleciona veículo da mesma empresa
-            company_vehicles = [v for v in vehicles if v['company_id'] == schedule['company_id']]
-            if not company_vehicles:
-                continue
-                
-            vehicle = random.choice(company_vehicles)
-            driver = random.choice(drivers) if drivers else None
-            
-            if not driver:
-                continue
-            
-            # Combina data com horário
-            cursor.execute("SELECT departure_time, arrival_time FROM schedule WHERE id_schedule = %s", 
-                          (schedule['id'],))
-            times = cursor.fetchone()
-            
-            departure_datetime = datetime.combine(trip_date, times[0])
-            
-            # Se houver hora de chegada
-            if times[1]:
-                arrival_datetime = datetime.combine(trip_date, times[1])
-                # Se a chegada é antes da saída, significa que cruza para o dia seguinte
-                if arrival_datetime <= departure_datetime:
-                    arrival_datetime = arrival_datetime + timedelta(days=1)
-            else:
-                arrival_datetime = None
+        company_vehicles = vehicles_by_company.get(schedule['company_id'])
+        if not company_vehicles or not drivers:
+            continue
+        days = tuple(schedule.get('days_of_week') or range(1, 8))
+        if days not in dates_by_days:
+            dates_by_days[days] = schedule_dates(calendar, days)
+        trip_dates = dates_by_days[days]
+        sells_tickets = route_stops is None or len(route_stops.get(schedule['route_id'], [])) >= 2
+        
+        # Duração fixa do horário; se a chegada é antes da saída, cruza para o dia seguinte
+        duration = None
+        if schedule['arrival_time']:
+            duration = (datetime.combine(today, schedule['arrival_time'])
+                        - datetime.combine(today, schedule['departure_time']))
+            if duration <= timedelta(0):
+                duration += timedelta(days=1)
+        
+        # Veículos e motoristas sorteados de uma vez para todas as datas
+        trip_vehicles = random.choices(company_vehicles, k=len(trip_dates))
+        trip_drivers = random.choices(drivers, k=len(trip_dates))
+        
+        for trip_date, vehicle, driver in zip(trip_dates, trip_vehicles, trip_drivers):
+            departure_datetime = datetime.combine(trip_date, schedule['departure_time'])
+            arrival_datetime = departure_datetime + duration if duration else None
             
             # Status da viagem
-            if trip_date < date.today():
+            if trip_date < today:
                 status = random.choice(['completed', 'completed', 'completed', 'cancelled'])
-            elif trip_date == date.today():
+            elif trip_date == today:
                 status = random.choice(['in_progress', 'scheduled'])
             else:
                 status = 'scheduled'
             
             # Capacidade disponível
+            capacity = vehicle['capacity']
             if status == 'completed':
-                available = random.randint(0, vehicle['capacity'] // 3)
+                available = random.randint(0, capacity // 3)
             elif status == 'cancelled':
-                available = vehicle['capacity']
+                available = capacity
             else:
-                available = random.randint(vehicle['capacity'] // 2, vehicle['capacity'])
+                available = random.randint(capacity // 2, capacity)
+            tickets = capacity - available
             
-            cursor.execute("""
-                INSERT INTO trip (id_schedule, id_vehicle, id_driver, trip_date,
-                                 departure_datetime, arrival_datetime, status, available_capacity)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id_trip
-            """, (schedule['id'], vehicle['id'], driver, trip_date,
-                  departure_datetime, arrival_datetime, status, available))
+            if tickets_per_trip is not None:
+                tickets = 0 if status == 'cancelled' else min(tickets_per_trip, capacity)
+            if not sells_tickets:
+                tickets = 0
+            # Tickets pagos são descontados pelo trigger update_trip_capacity;
+            # os de viagens concluídas ('used') já saem descontados
+            available = capacity - tickets if status == 'completed' else capacity
             
-            trip_id = cursor.fetchone()[0]
+            trip_id = ids.next()
+            loader.add((trip_id, schedule['id'], vehicle['id'], driver, trip_date,
+                        departure_datetime, arrival_datetime, status, available))
             trips.append({
                 'id': trip_id,
                 'schedule_id': schedule['id'],
+                'route_id': schedule['route_id'],
+                'company_id': schedule['company_id'],
                 'vehicle_id': vehicle['id'],
-                'capacity': vehicle['capacity'],
+                'capacity': capacity,
                 'available': available,
+                'tickets': tickets,
                 'status': status,
                 'has_assigned_seating': vehicle['has_assigned_seating'],
                 'date': trip_date  # Añadir fecha para calcular purchase_datetime
             })
     
+    loader.close()
     conn.commit()
-    cursor.close()
-    print(f"  ✓ {len(trips)} viagens criadas")
+    if verbose:
+        print(f"  ✓ {len(trips)} viagens criadas")
     return trips
 
-def insert_tickets(conn, trips, passengers, sellers):
-    """Insere tickets"""
-    print("Inserindo tickets...")
-    cursor = conn.cursor()
-    
-    # Buscar paradas por rota
-    cursor.execute("""
-        SELECT rs.id_route, rs.id_stop, rs.stop_order, rs.fare_from_origin
-        FROM route_stop rs
-        ORDER BY rs.id_route, rs.stop_order
-    """)
-    route_stops_data = cursor.fetchall()
-    
-    # Organizar paradas por rota
-    route_stops = {}
-    for row in route_stops_data:
-        route_id = row[0]
-        if route_id not in route_stops:
-            route_stops[route_id] = []
-        route_stops[route_id].append({
-            'stop_id': row[1],
-            'order': row[2],
-            'fare': row[3]
-        })
-    
-    # Buscar assentos por veículo
-    cursor.execute("SELECT id_seat, id_vehicle FROM seat WHERE is_active = true")
-    seats_data = cursor.fetchall()
-    vehicle_seats = {}
-    for seat_id, vehicle_id in seats_data:
-        if vehicle_id not in vehicle_seats:
-            vehicle_seats[vehicle_id] = []
-        vehicle_seats[vehicle_id].append(seat_id)
+def route_segments(stops):
+    """
+    Trechos de uma rota: (embarque, destino, preço) para cada par de paradas
+    em ordem, agrupados pelo índice da parada de embarque.
+    """
+    return [
+        [(boarding['stop_id'], destination['stop_id'], float(destination['fare'] - boarding['fare']))
+         for destination in stops[index + 1:]]
+        for index, boarding in enumerate(stops[:-1])
+    ]
+
+def allocate_trip_tickets(trip, segments, seats):
+    """
+    Sorteia assento e trecho dos tickets de uma viagem, só em memória.
+
+    Os assentos são sorteados sem reposição entre os do veículo, então
+    (id_trip, id_seat) nunca se repete e nenhum lote falha na carga. Viagens
+    em veículos com assentos vendem no máximo um ticket por assento; sem
+    trechos (rota com menos de 2 paradas) não há tickets. Devolve uma lista
+    de (id_seat, embarque, destino, preço).
+    """
+    if trip['status'] == 'cancelled' or not segments:
+        return []
+    count = trip['tickets']
+    if trip['has_assigned_seating']:
+        count = min(count, len(seats))
+        trip_seats = random.sample(seats, count)
+    else:
+        trip_seats = [None] * count
     
-    ticket_count = 0
+    tickets = []
+    for seat_id in trip_seats:
+        # Embarque uniforme e destino uniforme entre as paradas seguintes
+        boarding = random.choice(segments)
+        tickets.append((seat_id,) + random.choice(boarding))
+    return tickets
+
+def insert_tickets(conn, trips, passengers, sellers, route_stops, vehicle_seats, ids=None, verbose=True):
+    """
+    Insere tickets e devolve quantos foram criados.
+
+    `route_stops` e `vehicle_seats` vêm de insert_route_stops e insert_seats.
+    Com `ids` (IdRange), os tickets recebem IDs já reservados; sem, a
+    sequência os atribui na carga.
+    """
+    if verbose:
+        print("Inserindo tickets...")
+    columns = ('id_trip', 'id_passenger', 'id_seller', 'id_company', 'id_seat',
+               'id_boarding_stop', 'id_destination_stop', 'price',
+               'discount_applied', 'discount_reason', 'payment_method',
+               'status', 'purchase_datetime')
+    loader = TableLoader(conn, 'ticket', (('id_ticket',) + columns) if ids else columns)
+    # Trechos calculados uma vez por rota
+    segments = {route_id: route_segments(stops) for route_id, stops in route_stops.items()}
     
     for trip in trips:
-        if trip['status'] == 'cancelled':
-            continue
-        
-        # Número de tickets vendidos
-        tickets_sold = trip['capacity'] - trip['available']
-        
-        # Buscar rota e empresa do schedule
-        cursor.execute("SELECT id_route, id_company FROM schedule WHERE id_schedule = %s", 
-                      (trip['schedule_id'],))
-        result = cursor.fetchone()
-        if not result:
-            continue
-        route_id, company_id = result
-        
-        if route_id not in route_stops or len(route_stops[route_id]) < 2:
-            continue
+        # Assentos, paradas e preços de todos os tickets da viagem
+        allocated = allocate_trip_tickets(trip, segments.get(trip['route_id'], []),
+                                          vehicle_seats.get(trip['vehicle_id'], []))
+        company_id = trip['company_id']
         
-        stops = route_stops[route_id]
-        available_seats = vehicle_seats.get(trip['vehicle_id'], []).copy()
-        
-        for _ in range(tickets_sold):
+        for seat_id, boarding_stop, destination_stop, price in allocated:
             passenger = random.choice(passengers)
             seller = random.choice(sellers) if random.random() < 0.7 else None  # 70% vendas presenciais
             
-            # Seleciona paradas de embarque e destino
-            boarding_idx = random.randint(0, len(stops) - 2)
-            destination_idx = random.randint(boarding_idx + 1, len(stops) - 1)
-            
-            boarding_stop = stops[boarding_idx]['stop_id']
-            destination_stop = stops[destination_idx]['stop_id']
-            
-            # Calcula preço baseado na diferença de tarifas
-            price = float(stops[destination_idx]['fare'] - stops[boarding_idx]['fare'])
-            
             # Desconto para estudantes
             discount = 0.0
             discount_reason = None
@@ -629,11 +985,6 @@ def insert_tickets(conn, trips, passengers, sellers):
                 discount = round(price * 0.5, 2)  # 50% desconto
                 discount_reason = 'student'
             
-            # Assento (se aplicável)
-            seat_id = None
-            if trip['has_assigned_seating'] and available_seats:
-                seat_id = available_seats.pop(random.randint(0, len(available_seats) - 1))
-            
             payment_method = random.choice(['cash', 'card', 'pix', 'transfer'])
             status = 'used' if trip['status'] == 'completed' else 'paid'
             
@@ -643,70 +994,230 @@ def insert_tickets(conn, trips, passengers, sellers):
             purchase_time = time(random.randint(8, 20), random.randint(0, 59))
             purchase_datetime = datetime.combine(purchase_date, purchase_time)
             
-            try:
-                cursor.execute("""
-                    INSERT INTO ticket (id_trip, id_passenger, id_seller, id_company, id_seat,
-                                       id_boarding_stop, id_destination_stop, price,
-                                       discount_applied, discount_reason, payment_method, 
-                                       status, purchase_datetime)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (trip['id'], passenger['id'], seller, company_id, seat_id,
-                      boarding_stop, destination_stop, price,
-                      discount, discount_reason, payment_method, status, purchase_datetime))
-                ticket_count += 1
-            except psycopg2.IntegrityError as e:
-                # Ignora erros de constraint (assento já vendido, etc)
-                conn.rollback()
-                # Reinicia transação
-                cursor.execute("BEGIN;")
-                continue
-            except Exception as e:
-                # Para outros erros, imprime e continua
-                print(f"\n⚠️  Erro ao inserir ticket: {e}")
-                conn.rollback()
-                cursor.execute("BEGIN;")
-                continue
+            row = (trip['id'], passenger['id'], seller, company_id, seat_id,
+                   boarding_stop, destination_stop, price,
+                   discount, discount_reason, payment_method, status, purchase_datetime)
+            loader.add((ids.next(),) + row if ids else row)
     
+    loader.close()
     conn.commit()
-    cursor.close()
-    print(f"  ✓ {ticket_count} tickets criados")
+    if verbose:
+        print(f"  ✓ {loader.total} tickets criados")
+    return loader.total
+
+def partition_seed(seed, *keys):
+    """Semente de uma partição, derivada da semente geral e da chave da partição"""
+    text = ':'.join(str(part) for part in (seed,) + keys)
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big')
+
+def plan_trip_partitions(conn, company_ids, schedules, vehicles, drivers, route_stops, vehicle_seats,
+                         seed, calendar, partition_days=PARTITION_DAYS):
+    """
+    Divide viagens e tickets em partições por empresa e por trecho de
+    `partition_days` dias do calendário.
+
+    Cada partição recebe uma semente derivada da posição da empresa e do
+    trecho e faixas de IDs de viagens e tickets reservadas aqui, em ordem.
+    Assim os dados não dependem de quantos processos geram as partições nem
+    da ordem em que elas terminam.
+    """
+    schedules_by_company = {}
+    for schedule in schedules:
+        schedules_by_company.setdefault(schedule['company_id'], []).append(schedule)
+    vehicles_by_company = {}
+    for vehicle in vehicles:
+        vehicles_by_company.setdefault(vehicle['company_id'], []).append(vehicle)
+    
+    chunks = calendar_chunks(calendar, partition_days)
+    
+    partitions = []
+    for index, company_id in enumerate(company_ids):
+        company_schedules = schedules_by_company.get(company_id, [])
+        company_vehicles = vehicles_by_company.get(company_id, [])
+        # Mesma regra de insert_trips: sem veículos ou motoristas não há viagens
+        if not company_vehicles or not drivers:
+            continue
+        # Só as paradas e os assentos que as partições da empresa usam
+        company_route_stops = {schedule['route_id']: route_stops.get(schedule['route_id'], [])
+                               for schedule in company_schedules}
+        company_seats = {vehicle['id']: vehicle_seats.get(vehicle['id'], []) for vehicle in company_vehicles}
+        max_capacity = max(vehicle['capacity'] for vehicle in company_vehicles)
+        
+        for chunk, chunk_calendar in enumerate(chunks):
+            num_trips = sum(len(schedule_dates(chunk_calendar, schedule.get('days_of_week') or range(1, 8)))
+                            for schedule in company_schedules)
+            if not num_trips:
+                continue
+            partitions.append({
+                'index': index,
+                'chunk': chunk,
+                'seed': partition_seed(seed, 'company', index, 'days', chunk),
+                'calendar': chunk_calendar,
+                'schedules': company_schedules,
+                'vehicles': company_vehicles,
+                'route_stops': company_route_stops,
+                'vehicle_seats': company_seats,
+                'num_trips': num_trips,
+                # Cada viagem vende no máximo a capacidade do veículo
+                'max_tickets': num_trips * max_capacity,
+            })
+    
+    for count, table, column in (('num_trips', 'trip', 'id_trip'), ('max_tickets', 'ticket', 'id_ticket')):
+        if not partitions:
+            break
+        start = reserve_range(conn, table, column, sum(partition[count] for partition in partitions))
+        for partition in partitions:
+            partition[f'{table}_start'] = start
+            start += partition[count]
+    return partitions
+
+def generate_partition(conn, partition, shared):
+    """Gera e carrega as viagens e os tickets de uma partição; devolve (viagens, tickets)"""
+    random.seed(partition['seed'])
+    Faker.seed(partition['seed'])
+    if isinstance(conn, DatasetDirectory):
+        conn.prefix = f"company-{partition['index']:05d}-days-{partition['chunk']:05d}"
+    trips = insert_trips(conn, partition['schedules'], partition['vehicles'], shared['drivers'],
+                         tickets_per_trip=shared['tickets_per_trip'], ids=IdRange(partition['trip_start']),
+                         verbose=False, calendar=partition['calendar'],
+                         route_stops=partition['route_stops'])
+    tickets = insert_tickets(conn, trips, shared['passengers'], shared['sellers'],
+                             partition['route_stops'], partition['vehicle_seats'],
+                             ids=IdRange(partition['ticket_start']), verbose=False)
+    return len(trips), tickets
+
+# Estado de cada processo do pool: (conexão própria, dados compartilhados)
+_worker = None
 
-def main():
+def init_worker(config, load_mode, batch_size, shared):
+    global LOAD_MODE, BATCH_SIZE, _worker
+    LOAD_MODE = load_mode
+    BATCH_SIZE = batch_size
+    conn = config if isinstance(config, DatasetDirectory) else get_connection(config)
+    if not conn:
+        raise RuntimeError("Não foi possível conectar ao banco de dados")
+    _worker = (conn, shared)
+
+def run_partition(partition):
+    conn, shared = _worker
+    return generate_partition(conn, partition, shared)
+
+def insert_trips_and_tickets(conn, config, workers, partitions, shared):
+    """Gera as partições de viagens e tickets, em `workers` processos"""
+    print(f"Inserindo viagens e tickets ({len(partitions)} partições, {workers} processos)...")
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(config, LOAD_MODE, BATCH_SIZE, shared)) as pool:
+            results = list(pool.map(run_partition, partitions))
+    else:
+        results = [generate_partition(conn, partition, shared) for partition in partitions]
+    
+    print(f"  ✓ {sum(trips for trips, _ in results)} viagens criadas")
+    print(f"  ✓ {sum(tickets for _, tickets in results)} tickets criados")
+
+def parse_args(argv=None):
+    """
+    Lê as opções da linha de comando.
+
+    --scale multiplica os tamanhos de BASE_SIZES (como o fator de escala do
+    TPC); as opções de cada entidade substituem o valor escalado. Com a
+    mesma semente e as mesmas opções, o conjunto gerado é sempre o mesmo.
+    """
+    parser = argparse.ArgumentParser(description="Gera dados fictícios para o modelo novo do RodoDados")
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help="Fator de escala sobre os tamanhos base (padrão: 1)")
+    parser.add_argument('--companies', type=int, help="Número de empresas")
+    parser.add_argument('--stops', type=int, help="Número de paradas de ônibus")
+    parser.add_argument('--routes', type=int, help="Número de rotas")
+    parser.add_argument('--vehicles', type=int, help="Número de veículos")
+    parser.add_argument('--passengers', type=int, help="Número de passageiros")
+    parser.add_argument('--employees', type=int, help="Número de funcionários")
+    parser.add_argument('--schedules-per-route', type=int, default=3, help="Horários por rota (padrão: 3)")
+    parser.add_argument('--days', type=int, default=30, help="Dias de viagens, metade antes de hoje (padrão: 30)")
+    parser.add_argument('--tickets-per-trip', type=int,
+                        help="Tickets vendidos por viagem (padrão: sorteado pela ocupação)")
+    parser.add_argument('--seed', type=int, default=42, help="Semente do random e do Faker (padrão: 42)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Processos gerando viagens e tickets, em partições por empresa e "
+                             "por trecho de --partition-days dias (padrão: 1)")
+    parser.add_argument('--partition-days', type=int, default=PARTITION_DAYS,
+                        help=f"Dias de viagens de cada partição (padrão: {PARTITION_DAYS})")
+    parser.add_argument('--mode', choices=['copy', 'values', 'row'], default=LOAD_MODE,
+                        help=f"Modo de carga (padrão: {LOAD_MODE})")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                        help=f"Linhas por lote / por arquivo (padrão: {BATCH_SIZE})")
+    parser.add_argument('--output', help="Gera arquivos neste diretório em vez de gravar no banco "
+                                         "(carregue depois com load_dataset.py)")
+    parser.add_argument('--format', choices=['csv', 'parquet'], default='csv',
+                        help="Formato dos arquivos de --output (padrão: csv)")
+    for key, value in DB_CONFIG.items():
+        parser.add_argument(f'--{key}', type=type(value), default=value, help=f"Conexão: {key} (padrão: {value})")
+    args = parser.parse_args(argv)
+    
+    if args.scale <= 0:
+        parser.error("--scale precisa ser maior que zero")
+    if args.partition_days <= 0:
+        parser.error("--partition-days precisa ser maior que zero")
+    if args.output and args.format == 'parquet' and pyarrow is None:
+        parser.error("--format parquet precisa do pyarrow (pip install pyarrow)")
+    for entity, base in BASE_SIZES.items():
+        if getattr(args, entity) is None:
+            setattr(args, entity, max(1, round(base * args.scale)))
+    return args
+
+def main(argv=None):
     """Função principal"""
+    global LOAD_MODE, BATCH_SIZE
+    args = parse_args(argv)
+    LOAD_MODE = args.mode
+    BATCH_SIZE = args.batch_size
+    Faker.seed(args.seed)
+    random.seed(args.seed)
+    
     print("=" * 60)
     print("INJEÇÃO DE DADOS - SISTEMA DE TRANSPORTE RODOVIÁRIO")
     print("=" * 60)
+    print(f"Escala {args.scale:g}: {args.companies} empresas, {args.stops} paradas, {args.routes} rotas, "
+          f"{args.vehicles} veículos, {args.passengers} passageiros, {args.employees} funcionários, "
+          f"{args.days} dias (semente {args.seed}, "
+          + (f"arquivos {args.format} em {args.output})" if args.output else f"carga '{LOAD_MODE}')"))
     print()
     
-    conn = get_connection()
+    if args.output:
+        # Sem banco: cada processo grava arquivos no mesmo diretório
+        config = conn = DatasetDirectory(args.output, args.format)
+    else:
+        config = {key: getattr(args, key) for key in DB_CONFIG}
+        conn = get_connection(config)
     if not conn:
         print("❌ Não foi possível conectar ao banco de dados")
         return
     
     try:
         # 1. Empresas
-        company_ids = insert_companies(conn, num=5)
+        company_ids = insert_companies(conn, num=args.companies)
         
         # 2. Paradas de ônibus
-        stops = insert_bus_stops(conn, num=30)
+        stops = insert_bus_stops(conn, num=args.stops)
         
         # 3. Rotas
-        routes = insert_routes(conn, company_ids, num=10)
+        routes = insert_routes(conn, company_ids, num=args.routes)
         
         # 4. Paradas nas rotas
-        insert_route_stops(conn, routes, stops)
+        route_stops = insert_route_stops(conn, routes, stops)
         
         # 5. Horários
-        schedules = insert_schedules(conn, routes, num_per_route=3)
+        schedules = insert_schedules(conn, routes, num_per_route=args.schedules_per_route)
         
         # 6. Veículos
-        vehicles = insert_vehicles(conn, company_ids, num=15)
+        vehicles = insert_vehicles(conn, company_ids, num=args.vehicles)
         
         # 7. Assentos
-        insert_seats(conn, vehicles)
+        vehicle_seats = insert_seats(conn, vehicles)
         
         # 8. Pessoas
-        passengers, employee_ids = insert_people(conn, num_passengers=50, num_employees=20)
+        passengers, employee_ids = insert_people(conn, num_passengers=args.passengers,
+                                                 num_employees=args.employees)
         
         # 9. Estudantes
         insert_students(conn, passengers)
@@ -720,11 +1231,19 @@ def main():
         # 12. Vendedores
         seller_ids = insert_sellers(conn, sellers)
         
-        # 13. Viagens
-        trips = insert_trips(conn, schedules, vehicles, drivers, num_days=30)
-        
-        # 14. Tickets
-        insert_tickets(conn, trips, passengers, seller_ids)
+        # 13-14. Viagens e tickets, em partições por empresa e por trecho de datas
+        calendar = trip_calendar(args.days)
+        partitions = plan_trip_partitions(conn, company_ids, schedules, vehicles, drivers,
+                                          route_stops, vehicle_seats, args.seed, calendar,
+                                          args.partition_days)
+        conn.commit()
+        shared = {
+            'drivers': drivers,
+            'passengers': passengers,
+            'sellers': seller_ids,
+            'tickets_per_trip': args.tickets_per_trip,
+        }
+        insert_trips_and_tickets(conn, config, args.workers, partitions, shared)
         
         print()
         print("=" * 60)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carrega no banco um conjunto de dados gerado com datas_injection.py --output
+
+Os arquivos de cada tabela são carregados com COPY, na ordem das chaves
+estrangeiras, e no fim as sequências são ajustadas para depois do maior ID.
+O banco precisa estar vazio (os IDs dos arquivos começam em 1).
+"""
+
+import argparse
+import glob
+import os
+
+import datas_injection
+from datas_injection import DB_CONFIG, TableLoader, get_connection, pyarrow
+
+# Tabelas na ordem de carga (as referenciadas antes) e a coluna SERIAL de cada uma
+TABLES = [
+    ('company', 'id_company'),
+    ('bus_stop', 'id_stop'),
+    ('route', 'id_route'),
+    ('route_stop', None),
+    ('schedule', 'id_schedule'),
+    ('vehicle', 'id_vehicle'),
+    ('seat', 'id_seat'),
+    ('person', 'id_person'),
+    ('passenger', None),
+    ('student', None),
+    ('employee', None),
+    ('driver', None),
+    ('seller', None),
+    ('trip', 'id_trip'),
+    ('ticket', 'id_ticket'),
+]
+
+def load_csv(cursor, table, name):
+    """Carrega um arquivo CSV (com cabeçalho) numa tabela"""
+    with open(name, encoding='utf-8', newline='') as source:
+        columns = source.readline().strip()
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", source)
+    return cursor.rowcount
+
+def load_parquet(conn, table, name):
+    """Carrega um arquivo Parquet numa tabela, com COPY em lotes"""
+    data = pyarrow.parquet.read_table(name)
+    loader = TableLoader(conn, table, tuple(data.column_names))
+    for row in zip(*(data.column(column).to_pylist() for column in data.column_names)):
+        loader.add(row)
+    loader.close()
+    return loader.total
+
+def load_dataset(conn, path):
+    """Carrega todas as tabelas encontradas em `path`; devolve {tabela: linhas}"""
+    datas_injection.LOAD_MODE = 'copy'
+    cursor = conn.cursor()
+    counts = {}
+
+    for table, serial in TABLES:
+        # Os nomes dos arquivos mantêm a ordem em que foram gerados
+        names = sorted(glob.glob(os.path.join(path, table, '*.csv')) +
+                       glob.glob(os.path.join(path, table, '*.parquet')))
+        counts[table] = 0
+        for name in names:
+            if name.endswith('.parquet'):
+                if pyarrow is None:
+                    raise RuntimeError("Arquivos Parquet precisam do pyarrow (pip install pyarrow)")
+                counts[table] += load_parquet(conn, table, name)
+            else:
+                counts[table] += load_csv(cursor, table, name)
+        print(f"  ✓ {table}: {counts[table]} linhas ({len(names)} arquivos)")
+
+        if serial:
+            # Inserções seguintes continuam depois do maior ID carregado
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({serial}), 0) + 1, false) "
+                f"FROM {table}",
+                (table, serial)
+            )
+
+    cursor.close()
+    return counts
+
+def parse_args(argv=None):
+    """Lê as opções da linha de comando"""
+    parser = argparse.ArgumentParser(description="Carrega um conjunto gerado com datas_injection.py --output")
+    parser.add_argument('path', help="Diretório gerado com --output")
+    for key, value in DB_CONFIG.items():
+        parser.add_argument(f'--{key}', type=type(value), default=value, help=f"Conexão: {key} (padrão: {value})")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.path):
+        parser.error(f"{args.path} não é um diretório")
+    return args
+
+def main(argv=None):
+    """Função principal"""
+    args = parse_args(argv)
+
+    print("=" * 60)
+    print(f"CARGA DE DADOS - {args.path}")
+    print("=" * 60)
+
+    conn = get_connection({key: getattr(args, key) for key in DB_CONFIG})
+    if not conn:
+        print("❌ Não foi possível conectar ao banco de dados")
+        return
+
+    try:
+        counts = load_dataset(conn, args.path)
+        conn.commit()
+
+        print()
+        print("=" * 60)
+        print(f"✅ {sum(counts.values())} LINHAS CARREGADAS COM SUCESSO!")
+        print("=" * 60)
+
+    except Exception as e:
+        print(f"\n❌ Erro durante a carga: {e}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
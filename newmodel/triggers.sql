@@ -1,34 +1,65 @@
+-- Os gatilhos de Ticket são por comando (FOR EACH STATEMENT): cada INSERT
+-- ou UPDATE, com 1 ou N tickets, é validado com uma consulta sobre a tabela
+-- de transição e atualiza Trip com um único UPDATE agrupado.
+-- Tabelas de transição só valem para um evento por gatilho, por isso há um
+-- gatilho de INSERT e outro de UPDATE para cada função.
+-- O arquivo pode ser executado de novo sobre um banco existente: cada gatilho
+-- é recriado, e os antigos gatilhos por linha (sem o sufixo _insert/_update)
+-- são removidos para não validar nem descontar capacidade duas vezes.
+
 -- Função: Atualizar available_capacity em Trip ao vender ticket
 CREATE OR REPLACE FUNCTION update_trip_capacity()
 RETURNS TRIGGER AS $$
 BEGIN
-    IF (TG_OP = 'INSERT' AND NEW.status = 'paid') THEN
-        -- Ao inserir ticket pago, reduzir capacidade
-        UPDATE Trip 
-        SET available_capacity = available_capacity - 1
-        WHERE id_trip = NEW.id_trip;
-        
-    ELSIF (TG_OP = 'UPDATE' AND OLD.status != 'paid' AND NEW.status = 'paid') THEN
-        -- Ao mudar estado para pago, reduzir capacidade
-        UPDATE Trip 
-        SET available_capacity = available_capacity - 1
-        WHERE id_trip = NEW.id_trip;
-        
-    ELSIF (TG_OP = 'UPDATE' AND OLD.status = 'paid' AND NEW.status IN ('cancelled', 'expired')) THEN
-        -- Ao cancelar ticket, aumentar capacidade
-        UPDATE Trip 
-        SET available_capacity = available_capacity + 1
-        WHERE id_trip = NEW.id_trip;
+    IF (TG_OP = 'INSERT') THEN
+        -- Ao inserir tickets pagos, reduzir capacidade
+        UPDATE Trip t
+        SET available_capacity = t.available_capacity - n.total
+        FROM (
+            SELECT id_trip, COUNT(*) AS total
+            FROM new_tickets
+            WHERE status = 'paid'
+            GROUP BY id_trip
+        ) n
+        WHERE t.id_trip = n.id_trip;
+
+    ELSIF (TG_OP = 'UPDATE') THEN
+        -- Ao mudar estado para pago, reduzir capacidade;
+        -- ao cancelar ticket pago, aumentar capacidade
+        UPDATE Trip t
+        SET available_capacity = t.available_capacity + n.total
+        FROM (
+            SELECT novo.id_trip,
+                   SUM(CASE
+                           WHEN antigo.status != 'paid' AND novo.status = 'paid' THEN -1
+                           WHEN antigo.status = 'paid' AND novo.status IN ('cancelled', 'expired') THEN 1
+                           ELSE 0
+                       END) AS total
+            FROM new_tickets novo
+            JOIN old_tickets antigo ON antigo.id_ticket = novo.id_ticket
+            GROUP BY novo.id_trip
+        ) n
+        WHERE t.id_trip = n.id_trip AND n.total != 0;
     END IF;
-    
-    RETURN NEW;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger para atualizar capacidade automaticamente
-CREATE TRIGGER trg_update_trip_capacity
-AFTER INSERT OR UPDATE ON Ticket
-FOR EACH ROW
+-- Gatilhos para atualizar capacidade automaticamente
+DROP TRIGGER IF EXISTS trg_update_trip_capacity ON Ticket;
+DROP TRIGGER IF EXISTS trg_update_trip_capacity_insert ON Ticket;
+CREATE TRIGGER trg_update_trip_capacity_insert
+AFTER INSERT ON Ticket
+REFERENCING NEW TABLE AS new_tickets
+FOR EACH STATEMENT
+EXECUTE FUNCTION update_trip_capacity();
+
+DROP TRIGGER IF EXISTS trg_update_trip_capacity_update ON Ticket;
+CREATE TRIGGER trg_update_trip_capacity_update
+AFTER UPDATE ON Ticket
+REFERENCING OLD TABLE AS old_tickets NEW TABLE AS new_tickets
+FOR EACH STATEMENT
 EXECUTE FUNCTION update_trip_capacity();
 
 COMMENT ON FUNCTION update_trip_capacity() IS 'Atualiza automaticamente a capacidade disponível do Trip ao vender/cancelar tickets';
@@ -37,33 +68,41 @@ COMMENT ON FUNCTION update_trip_capacity() IS 'Atualiza automaticamente a capaci
 CREATE OR REPLACE FUNCTION validate_seat_vehicle()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_vehicle_id INT;
-    v_trip_vehicle_id INT;
+    v_seat_id INT;
 BEGIN
-    -- Somente validar se um assento for atribuído
-    IF NEW.id_seat IS NOT NULL THEN
-        -- Obter o veículo do assento
-        SELECT id_vehicle INTO v_vehicle_id
-        FROM Seat WHERE id_seat = NEW.id_seat;
-        
-        -- Obter o veículo da viagem
-        SELECT id_vehicle INTO v_trip_vehicle_id
-        FROM Trip WHERE id_trip = NEW.id_trip;
-        
-        -- Validar que coincidam
-        IF v_vehicle_id != v_trip_vehicle_id THEN
-            RAISE EXCEPTION 'O assento % não pertence ao veículo da viagem', NEW.id_seat;
-        END IF;
+    -- Somente validar tickets com assento atribuído, comparando o veículo
+    -- do assento com o veículo da viagem
+    SELECT n.id_seat INTO v_seat_id
+    FROM new_tickets n
+    JOIN Seat s ON s.id_seat = n.id_seat
+    JOIN Trip t ON t.id_trip = n.id_trip
+    WHERE s.id_vehicle != t.id_vehicle
+    ORDER BY n.id_ticket
+    LIMIT 1;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'O assento % não pertence ao veículo da viagem', v_seat_id;
     END IF;
-    
-    RETURN NEW;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger para validar assento antes de inserir ticket
-CREATE TRIGGER trg_validate_seat_vehicle
-BEFORE INSERT OR UPDATE ON Ticket
-FOR EACH ROW
+-- Gatilhos para validar assento ao inserir ou alterar tickets
+-- (a exceção desfaz o comando inteiro, como no BEFORE por linha)
+DROP TRIGGER IF EXISTS trg_validate_seat_vehicle ON Ticket;
+DROP TRIGGER IF EXISTS trg_validate_seat_vehicle_insert ON Ticket;
+CREATE TRIGGER trg_validate_seat_vehicle_insert
+AFTER INSERT ON Ticket
+REFERENCING NEW TABLE AS new_tickets
+FOR EACH STATEMENT
+EXECUTE FUNCTION validate_seat_vehicle();
+
+DROP TRIGGER IF EXISTS trg_validate_seat_vehicle_update ON Ticket;
+CREATE TRIGGER trg_validate_seat_vehicle_update
+AFTER UPDATE ON Ticket
+REFERENCING NEW TABLE AS new_tickets
+FOR EACH STATEMENT
 EXECUTE FUNCTION validate_seat_vehicle();
 
 COMMENT ON FUNCTION validate_seat_vehicle() IS 'Verifica que o assento atribuído pertence ao veículo da viagem';
@@ -72,45 +111,57 @@ COMMENT ON FUNCTION validate_seat_vehicle() IS 'Verifica que o assento atribuíd
 CREATE OR REPLACE FUNCTION validate_trip_stops()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_route_id INT;
+    v_boarding_stop INT;
+    v_destination_stop INT;
     v_boarding_exists BOOLEAN;
-    v_destination_exists BOOLEAN;
 BEGIN
-    -- Obter a rota da viagem
-    SELECT r.id_route INTO v_route_id
-    FROM Trip t
-    JOIN Schedule s ON t.id_schedule = s.id_schedule
-    JOIN Route r ON s.id_route = r.id_route
-    WHERE t.id_trip = NEW.id_trip;
-    
-    -- Verificar que a parada de embarque existe na rota
-    SELECT EXISTS (
-        SELECT 1 FROM Route_Stop 
-        WHERE id_route = v_route_id AND id_stop = NEW.id_boarding_stop
-    ) INTO v_boarding_exists;
-    
-    -- Verificar que a parada de destino existe na rota
-    SELECT EXISTS (
-        SELECT 1 FROM Route_Stop 
-        WHERE id_route = v_route_id AND id_stop = NEW.id_destination_stop
-    ) INTO v_destination_exists;
-    
-    IF NOT v_boarding_exists THEN
-        RAISE EXCEPTION 'A parada de embarque % não pertence à rota da viagem', NEW.id_boarding_stop;
+    -- Primeiro ticket (na ordem de id) com alguma parada fora da rota da viagem
+    SELECT v.id_boarding_stop, v.id_destination_stop, v.boarding_exists
+    INTO v_boarding_stop, v_destination_stop, v_boarding_exists
+    FROM (
+        SELECT n.id_ticket, n.id_boarding_stop, n.id_destination_stop,
+               EXISTS (
+                   SELECT 1 FROM Route_Stop rs
+                   WHERE rs.id_route = s.id_route AND rs.id_stop = n.id_boarding_stop
+               ) AS boarding_exists,
+               EXISTS (
+                   SELECT 1 FROM Route_Stop rs
+                   WHERE rs.id_route = s.id_route AND rs.id_stop = n.id_destination_stop
+               ) AS destination_exists
+        FROM new_tickets n
+        LEFT JOIN Trip t ON t.id_trip = n.id_trip
+        LEFT JOIN Schedule s ON t.id_schedule = s.id_schedule
+    ) v
+    WHERE NOT (v.boarding_exists AND v.destination_exists)
+    ORDER BY v.id_ticket
+    LIMIT 1;
+
+    IF FOUND AND NOT v_boarding_exists THEN
+        RAISE EXCEPTION 'A parada de embarque % não pertence à rota da viagem', v_boarding_stop;
     END IF;
-    
-    IF NOT v_destination_exists THEN
-        RAISE EXCEPTION 'A parada de destino % não pertence à rota da viagem', NEW.id_destination_stop;
+
+    IF FOUND THEN
+        RAISE EXCEPTION 'A parada de destino % não pertence à rota da viagem', v_destination_stop;
     END IF;
-    
-    RETURN NEW;
+
+    RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
 
--- Trigger para validar paradas
-CREATE TRIGGER trg_validate_trip_stops
-BEFORE INSERT OR UPDATE ON Ticket
-FOR EACH ROW
+-- Gatilhos para validar paradas
+DROP TRIGGER IF EXISTS trg_validate_trip_stops ON Ticket;
+DROP TRIGGER IF EXISTS trg_validate_trip_stops_insert ON Ticket;
+CREATE TRIGGER trg_validate_trip_stops_insert
+AFTER INSERT ON Ticket
+REFERENCING NEW TABLE AS new_tickets
+FOR EACH STATEMENT
+EXECUTE FUNCTION validate_trip_stops();
+
+DROP TRIGGER IF EXISTS trg_validate_trip_stops_update ON Ticket;
+CREATE TRIGGER trg_validate_trip_stops_update
+AFTER UPDATE ON Ticket
+REFERENCING NEW TABLE AS new_tickets
+FOR EACH STATEMENT
 EXECUTE FUNCTION validate_trip_stops();
 
-COMMENT ON FUNCTION validate_trip_stops() IS 'Verifica que as paradas de embarque e destino pertencem à rota da viagem';
\ No newline at end of file
+COMMENT ON FUNCTION validate_trip_stops() IS 'Verifica que as paradas de embarque e destino pertencem à rota da viagem';